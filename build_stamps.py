@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+#
+# build_stamps - make-style incremental rebuilds for the converters
+#
+# nontama_to_bload.py, mload_to_bload.py, mkrom.py and mkmsxrom.py record in STAMPS_DIR_NAME in the current directory, one stamp file per tool and input file, the content hash of each input, the version of the tool (and the helper modules it imports) that converted it, and the size and mtime of each output. An input is only converted again when its hash or the tool changed, or an output went missing or was modified since; outputs that come out the same as before are not rewritten, so they keep their mtime. Each stamp file is replaced atomically and only ever written by the build of its own input, so converters running in parallel on different inputs do not lose each other's stamps. Delete STAMPS_DIR_NAME to force a full rebuild. Run this script to list the recorded builds.
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+STAMPS_DIR_NAME = ".bload_stamps"
+STAMPS_FORMAT_VERSION = 2
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def tool_version(*tool_file_paths, **options):
+    """Return the version of the converter made up of the source files
+    `tool_file_paths` (the converter and the helper modules it imports)
+    used with `options`, which changes whenever any of them does."""
+    sources = []
+    for tool_file_path in tool_file_paths:
+        with open(tool_file_path, "rb") as f:
+            sources.append(f.read())
+    version = content_hash(b"\0".join(sources))[:16]
+    return ",".join([version] + [f"{name}={value!r}" for name, value in sorted(options.items())])
+
+
+def stamp_file_path(key):
+    """Return the path of the stamp file for the build `key`."""
+    return os.path.join(STAMPS_DIR_NAME, content_hash(key.encode("utf-8"))[:32] + ".json")
+
+
+def load_build(stamp_file_name):
+    """Return the build recorded in `stamp_file_name`, or None if there
+    is none in the current format."""
+    try:
+        with open(stamp_file_name, "r", encoding="utf-8") as f:
+            build = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if build.get("version") != STAMPS_FORMAT_VERSION:
+        return None
+    return build
+
+
+def save_build(stamp_file_name, build):
+    """Write `build` to `stamp_file_name`, replacing it atomically."""
+    os.makedirs(STAMPS_DIR_NAME, exist_ok=True)
+    temp_file_name = f"{stamp_file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file_name, "w", encoding="utf-8") as f:
+            json.dump(build, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(temp_file_name, stamp_file_name)
+    except BaseException:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+
+
+def output_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_key(tool_name, input_file_path):
+    return f"{tool_name}:{os.path.abspath(input_file_path)}"
+
+
+def up_to_date_build(key, *, input_hash, version):
+    """Return the results recorded for `key` if they were built from
+    an input with `input_hash` by the tool at `version` and all their
+    outputs are still as written, otherwise None."""
+    build = load_build(stamp_file_path(key))
+    if build is None or build["key"] != key or build["input_hash"] != input_hash or build["tool_version"] != version:
+        return None
+    for path, stamp in build["outputs"].items():
+        try:
+            if output_stamp(path) != stamp:
+                return None
+        except OSError:
+            return None
+    return build["results"]
+
+
+def record_build(key, *, input_hash, version, outfns, results):
+    """Record for `key` that `outfns` were built from the input with
+    `input_hash` by the tool at `version`, along with the
+    JSON-serializable `results` to hand back next time."""
+    stamp_file_name = stamp_file_path(key)
+    save_build(
+        stamp_file_name,
+        dict(
+            version=STAMPS_FORMAT_VERSION,
+            key=key,
+            input_hash=input_hash,
+            tool_version=version,
+            outputs={path: output_stamp(path) for path in outfns},
+            results=results,
+        ),
+    )
+
+
+def main():
+    _, *args = (  # usage: python build_stamps.py  ## lists the builds recorded in the current directory
+        sys.argv
+    )
+    assert not args, f"Unexpected arguments {' '.join(args)}"
+    try:
+        stamp_file_names = [os.path.join(STAMPS_DIR_NAME, name) for name in os.listdir(STAMPS_DIR_NAME) if name.endswith(".json")]
+    except OSError:
+        stamp_file_names = []
+    builds = [build for build in map(load_build, stamp_file_names) if build is not None]
+    for build in sorted(builds, key=lambda build: build["key"]):
+        print(
+            f"{build['key']}: input_hash={build['input_hash']}, tool_version={build['tool_version']}, outputs={', '.join(build['outputs'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
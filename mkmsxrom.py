@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+#
+# mkmsxrom - build MSX cartridge ROM images for games converted from the "M" loader
+#
+# Use mload_to_bload.py to convert from CAS to MSX BLOAD format. The expected filename is something like `GAME_LOAD_9000_A388_9010.bin`. By default all such files in the current directory will be processed. The generated ROM will be `GAME_LOAD_msx.rom` or so.
+#
+# The ROM's INIT routine copies the game to RAM, then jumps to a small trampoline in RAM which puts the main ROM back in page 1 and starts the game. Games that fit in 16 KiB make a plain 16 KiB ROM; larger ones make an ASCII8 MegaROM with the rest of the game in 8 KiB banks, which the INIT routine maps in at 0x6000 one at a time.
+
+import os
+import struct
+import sys
+
+from mkrom import Z80, assemble
+
+MSX_BLOAD_MAGIC = b"\xfe"  # mload_to_bload.MSX_BLOAD_MAGIC
+MSX_ROM_START_ADDR = 0x4000
+MSX_ROM_HEADER_SIZE = 0x10
+MSX_ROM_BANK_SIZE = 0x2000
+MSX_ROM_BANK_WINDOW_ADDR = 0x6000
+ASCII8_BANK_SELECT_6000_ADDR = 0x6800  # ASCII8 mapper register for 0x6000-0x7FFF
+MSX_PLAIN_ROM_SIZE = 0x4000
+MSX_MEGAROM_MIN_SIZE = 0x10000  # smaller ROMs are taken for plain ROMs without a mapper
+MSX_RAM_START_ADDR = 0x8000  # pages 2 and 3 are RAM when INIT runs
+MSX_WORK_AREA_START_ADDR = 0xF380  # BIOS work area
+MSX_EXPTBL = 0xFCC1  # slot of the main ROM
+MSX_BIOS_ENASLT = 0x0024
+
+
+def msx_rom_header(init_addr):
+    return b"AB" + struct.pack("<HHHH", init_addr, 0, 0, 0) + 6 * b"\x00"
+
+
+def msx_trampoline(exe_addr):
+    return (
+        Z80["LD_A_mem"](MSX_EXPTBL)
+        + Z80["LD_H_immed"](MSX_ROM_START_ADDR >> 8)
+        + Z80["CALL_addr"](MSX_BIOS_ENASLT)  # main ROM back in page 1, as for BLOAD from BASIC
+        + Z80["EI"]()
+        + Z80["JP_addr"](exe_addr)
+    )
+
+
+def msx_loader(*, load_addr, first_block_length, bank_block_lengths, trampoline, trampoline_addr):
+    """Return the INIT routine, followed by its trampoline, which
+    copies the first block of the game from right after them in bank 0
+    and the others from banks 1, 2, ... to RAM at `load_addr`, then
+    copies the trampoline to `trampoline_addr` and jumps to it."""
+    init_addr = MSX_ROM_START_ADDR + MSX_ROM_HEADER_SIZE
+    bank_loaders = []
+    for bank, block_length in enumerate(bank_block_lengths, 1):
+        bank_loaders += [
+            Z80["LD_A_immed"](bank),
+            Z80["LD_mem_A"](ASCII8_BANK_SELECT_6000_ADDR),
+            Z80["LD_HL_immed"](MSX_ROM_BANK_WINDOW_ADDR),
+            Z80["LD_BC_immed"](block_length),
+            Z80["LDIR"](),
+        ]
+    return assemble(
+        init_addr,
+        (Z80["LD_HL_immed"], "first_block"),
+        Z80["LD_DE_immed"](load_addr),
+        Z80["LD_BC_immed"](first_block_length),
+        Z80["LDIR"](),
+        *bank_loaders,
+        (Z80["LD_HL_immed"], "trampoline"),
+        Z80["LD_DE_immed"](trampoline_addr),
+        Z80["LD_BC_immed"](len(trampoline)),
+        Z80["LDIR"](),
+        Z80["JP_addr"](trampoline_addr),
+        "trampoline",
+        trampoline,
+        "first_block",
+    )
+
+
+def mkmsxrom(*, payload, load_addr, stop_addr, exe_addr):
+    assert (
+        MSX_RAM_START_ADDR <= load_addr < stop_addr <= MSX_WORK_AREA_START_ADDR
+    ), f"Game at 0x{load_addr:04X}-0x{stop_addr:04X} must load into RAM at 0x{MSX_RAM_START_ADDR:04X}-0x{MSX_WORK_AREA_START_ADDR:04X}"
+    trampoline = msx_trampoline(exe_addr)
+    if stop_addr + len(trampoline) <= MSX_WORK_AREA_START_ADDR:
+        trampoline_addr = stop_addr
+    else:
+        assert (
+            load_addr - len(trampoline) >= MSX_RAM_START_ADDR
+        ), f"No free RAM for the trampoline around 0x{load_addr:04X}-0x{stop_addr:04X}"
+        trampoline_addr = load_addr - len(trampoline)
+    bank_count = 0
+    while True:  # adding banks grows the loader, which shrinks the first block
+        loader_size = len(
+            msx_loader(
+                load_addr=load_addr,
+                first_block_length=0,
+                bank_block_lengths=bank_count * [0],
+                trampoline=trampoline,
+                trampoline_addr=trampoline_addr,
+            )
+        )
+        first_block_length = min(
+            len(payload), MSX_ROM_BANK_SIZE - MSX_ROM_HEADER_SIZE - loader_size
+        )
+        rest = payload[first_block_length:]
+        bank_block_lengths = [
+            len(rest[i : i + MSX_ROM_BANK_SIZE])
+            for i in range(0, len(rest), MSX_ROM_BANK_SIZE)
+        ]
+        if len(bank_block_lengths) == bank_count:
+            break
+        bank_count = len(bank_block_lengths)
+    rom = (
+        msx_rom_header(MSX_ROM_START_ADDR + MSX_ROM_HEADER_SIZE)
+        + msx_loader(
+            load_addr=load_addr,
+            first_block_length=first_block_length,
+            bank_block_lengths=bank_block_lengths,
+            trampoline=trampoline,
+            trampoline_addr=trampoline_addr,
+        )
+        + payload[:first_block_length]
+    )
+    rom += b"\x00" * (MSX_ROM_BANK_SIZE - len(rom))
+    for i in range(0, len(rest), MSX_ROM_BANK_SIZE):
+        rom += rest[i : i + MSX_ROM_BANK_SIZE]
+        rom += b"\x00" * (-len(rom) % MSX_ROM_BANK_SIZE)
+    rom_size = MSX_PLAIN_ROM_SIZE
+    if len(rom) > MSX_PLAIN_ROM_SIZE:
+        rom_size = MSX_MEGAROM_MIN_SIZE
+        while rom_size < len(rom):
+            rom_size *= 2
+    rom += b"\xff" * (rom_size - len(rom))
+    return rom
+
+
+MLOAD_BLOAD_FILE_NAME_PATTERN = "*_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F]_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F]_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F].[Bb][Ii][Nn]"
+MLOAD_BLOAD_FILE_NAME_PATTERN_DESCRIPTION = "'*_XXXX_YYYY_ZZZZ.bin' where XXXX is hexadecimal load start address, YYYY is hexadecimal load stop address, and ZZZZ is hexadecimal entry point"
+
+
+def looks_like_msx_bload_file(input_file_path):
+    """Return whether `input_file_path` has a whole MSX BLOAD header
+    matching the addresses in its name and the length they give, which
+    tells it apart from a PC-6001 BLOAD file whose start address
+    happens to end in `MSX_BLOAD_MAGIC`."""
+    input_file_name = os.path.basename(input_file_path)
+    try:
+        load_addr, stop_addr, exe_addr = (
+            int(hexaddr, 16)
+            for hexaddr in os.path.splitext(input_file_name)[0].split("_")[-3:]
+        )
+        with open(input_file_path, "rb") as f:
+            header = f.read(7)
+        file_size = os.path.getsize(input_file_path)
+    except (OSError, ValueError):
+        return False
+    return (
+        header == MSX_BLOAD_MAGIC + struct.pack("<HHH", load_addr, stop_addr, exe_addr)
+        and file_size == 7 + stop_addr - load_addr
+    )
+
+
+def read_msx_bload_file(input_file_path, *, name_pattern_re=None):
+    """Read and check the MSX BLOAD file `input_file_path` named
+    according to mload_to_bload conventions, and return its game name
+    (the file name without the address suffix), payload and
+    addresses."""
+    if name_pattern_re is None:
+        import fnmatch
+        import re
+
+        name_pattern_re = re.compile(fnmatch.translate(MLOAD_BLOAD_FILE_NAME_PATTERN))
+    assert os.path.exists(
+        input_file_path
+    ), f"{input_file_path}: input file does not exist"
+    input_file_name = os.path.basename(input_file_path)
+    assert name_pattern_re.match(
+        input_file_name
+    ), f"{input_file_name}: input file must be named according to mload_to_bload conventions: {MLOAD_BLOAD_FILE_NAME_PATTERN_DESCRIPTION}"
+    load_addr, stop_addr, exe_addr = (
+        int(hexaddr, 16)
+        for hexaddr in os.path.splitext(input_file_name)[0].split("_")[-3:]
+    )
+    assert load_addr < stop_addr
+    expected_length = 7 + (stop_addr - load_addr)
+    bload_data = open(input_file_path, "rb").read()
+    assert (
+        len(bload_data) == expected_length
+    ), f"{input_file_path}: wrong length, expected 0x{expected_length:04X} from filename but got 0x{len(bload_data):04X}"
+    assert bload_data[:1] == MSX_BLOAD_MAGIC and struct.unpack(
+        "<HHH", bload_data[1:7]
+    ) == (
+        load_addr,
+        stop_addr,
+        exe_addr,
+    ), f"{input_file_path}: filename suffix and BLOAD header do not match"
+    return dict(
+        name="_".join(os.path.splitext(input_file_name)[0].split("_")[:-3]),
+        payload=bload_data[7:],
+        load_addr=load_addr,
+        stop_addr=stop_addr,
+        exe_addr=exe_addr,
+    )
+
+
+def mkmsxrom_file(input_file_path, *, name_pattern_re=None):
+    """Build the MSX ROM for the MSX BLOAD file `input_file_path` in
+    the current directory and return the ROM's file name."""
+    import build_stamps
+    import mkrom
+    import output_writer
+
+    game = read_msx_bload_file(input_file_path, name_pattern_re=name_pattern_re)
+    msx_rom_file_name = game["name"] + "_msx.rom"
+    stamp_key = build_stamps.build_key("mkmsxrom", input_file_path)
+    input_hash = build_stamps.content_hash(
+        struct.pack("<HHH", game["load_addr"], game["stop_addr"], game["exe_addr"])
+        + game["payload"]
+    )
+    tool_version = build_stamps.tool_version(__file__, mkrom.__file__)
+    if (
+        build_stamps.up_to_date_build(
+            stamp_key, input_hash=input_hash, version=tool_version
+        )
+        is not None
+    ):
+        print(f"{msx_rom_file_name}: up to date")
+        return msx_rom_file_name
+    msx_rom = mkmsxrom(
+        payload=game["payload"],
+        load_addr=game["load_addr"],
+        stop_addr=game["stop_addr"],
+        exe_addr=game["exe_addr"],
+    )
+    if output_writer.write_output(msx_rom_file_name, msx_rom):
+        print(
+            f"generated {msx_rom_file_name} ({'ASCII8 MegaROM' if len(msx_rom) > MSX_PLAIN_ROM_SIZE else 'plain ROM'}, {len(msx_rom) // 1024} KiB)"
+        )
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=[msx_rom_file_name],
+        results=msx_rom_file_name,
+    )
+    return msx_rom_file_name
+
+
+def main():
+    import fnmatch
+    import glob
+    import re
+
+    _, *input_file_paths = (  # usage: python mkmsxrom.py [GAME_XXXX_YYYY_ZZZZ.bin ...]  ## writes GAME_msx.rom per game
+        sys.argv
+    )
+    if not input_file_paths:
+        input_file_paths = [
+            input_file_path
+            for input_file_path in glob.glob(MLOAD_BLOAD_FILE_NAME_PATTERN)
+            if looks_like_msx_bload_file(input_file_path)
+        ]
+    assert (
+        input_file_paths
+    ), f"Did not find any MSX BLOAD files in the current working directory named according to mload_to_bload conventions: {MLOAD_BLOAD_FILE_NAME_PATTERN_DESCRIPTION}"
+    name_pattern_re = re.compile(fnmatch.translate(MLOAD_BLOAD_FILE_NAME_PATTERN))
+    for input_file_path in input_file_paths:
+        mkmsxrom_file(input_file_path, name_pattern_re=name_pattern_re)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,7 @@
 #
 # The loader on tape XOR's the game as it reads it into RAM, so use nontama_to_bload.py to convert from P6/P6T to BLOAD format. The expected filename is something like `GAME_0103_5327_0103.bin`. By default all such files in the current directory will be processed. The generated ROM will be `GAME_warrior.rom` or so.
 
-import fnmatch
-import glob
 import os
-import re
 import struct
 import sys
 
@@ -19,6 +16,7 @@ Z80 = dict(  # just enough Z80 opcodes to make a loader and trampoline
     OR_immed=lambda immed8: struct.pack("BB", 0xF6, immed8),
     LD_mem_A=lambda addr16: struct.pack("<BH", 0x32, addr16),
     NOP=lambda: b"\x00",
+    EI=lambda: b"\xfb",
     XOR_A=lambda: b"\xaf",
     LD_B_H=lambda: b"\x44",
     LD_C_L=lambda: b"\x4d",
@@ -30,6 +28,40 @@ Z80 = dict(  # just enough Z80 opcodes to make a loader and trampoline
     LD_HL_immed=lambda immed16: struct.pack("<BH", 0x21, immed16),
     SBC_HL_DE=lambda: struct.pack("BB", 0xED, 0x52),
     LDIR=lambda: struct.pack("BB", 0xED, 0xB0),
+    LD_A_HL_ind=lambda: b"\x7e",
+    LD_E_HL_ind=lambda: b"\x5e",
+    LD_D_HL_ind=lambda: b"\x56",
+    EX_DE_HL=lambda: b"\xeb",
+    DI=lambda: b"\xf3",
+    LD_A_C=lambda: b"\x79",
+    LD_E_A=lambda: b"\x5f",
+    LD_L_A=lambda: b"\x6f",
+    LD_B_immed=lambda immed8: struct.pack("BB", 0x06, immed8),
+    LD_C_immed=lambda immed8: struct.pack("BB", 0x0E, immed8),
+    LD_D_immed=lambda immed8: struct.pack("BB", 0x16, immed8),
+    LD_H_immed=lambda immed8: struct.pack("BB", 0x26, immed8),
+    LD_BC_immed=lambda immed16: struct.pack("<BH", 0x01, immed16),
+    LD_DE_immed=lambda immed16: struct.pack("<BH", 0x11, immed16),
+    ADD_HL_HL=lambda: b"\x29",
+    ADD_HL_DE=lambda: b"\x19",
+    INC_HL=lambda: b"\x23",
+    INC_C=lambda: b"\x0c",
+    OR_A=lambda: b"\xb7",
+    CP_HL_ind=lambda: b"\xbe",
+    PUSH_HL=lambda: b"\xe5",
+    POP_HL=lambda: b"\xe1",
+    CALL_addr=lambda addr16: struct.pack("<BH", 0xCD, addr16),
+    JR_Z_index=lambda index8: struct.pack("Bb", 0x28, index8),
+    DJNZ_index=lambda index8: struct.pack("Bb", 0x10, index8),
+    JR_NZ_index=lambda index8: struct.pack("Bb", 0x20, index8),
+    JP_Z_addr=lambda addr16: struct.pack("<BH", 0xCA, addr16),
+    CP_immed=lambda immed8: struct.pack("BB", 0xFE, immed8),
+    INC_A=lambda: b"\x3c",
+    INC_E=lambda: b"\x1c",
+    LD_A_E=lambda: b"\x7b",
+    LD_C_A=lambda: b"\x4f",
+    LD_B_HL_ind=lambda: b"\x46",
+    DEFW=lambda addr16: struct.pack("<H", addr16),  # not an opcode: an address in a table
 )
 
 
@@ -39,6 +71,29 @@ def indexed_op(op, addr16, *, current_addr16):
     return op(index8=index8)
 
 
+def assemble(origin, *items, labels=None):
+    """Assemble `items` for address `origin` and return the code. Each
+    item is either bytes, a label name, or a (op, label) pair for an
+    op taking the label's address (JR/DJNZ ops take it as an index).
+    The label addresses are also stored in `labels`, if given."""
+    labels = {} if labels is None else labels
+    for _ in range(2):  # the first pass only collects label addresses
+        code = b""
+        for item in items:
+            if isinstance(item, str):
+                labels[item] = origin + len(code)
+            elif isinstance(item, tuple):
+                op, label = item
+                addr16 = labels.get(label, origin + len(code))
+                if "index8" in op.__code__.co_varnames:
+                    code += indexed_op(op, addr16, current_addr16=origin + len(code))
+                else:
+                    code += op(addr16)
+            else:
+                code += item
+    return code
+
+
 def n60_rom_header(rom_entry_point):
     return b"AB" + struct.pack("<H", rom_entry_point)
 
@@ -49,6 +104,7 @@ FAKE_BLOAD_MAGIC = b"\xfe"  # magic byte used for BLOAD data on FAT12/16/etc.
 PAGE_LOADER_CONTINUATION_ENTRY_POINT = ROM_START_ADDR + 0x38
 
 BELUGA_BANK_C_SWITCH_PORT = 0x7F
+MSX_VDP_REGISTER_1_SHADOW_ADDR = 0xF3E0  # plain RAM on the PC-6001, so page loaders change whatever is loaded there
 
 
 def fake_bload_header(load_start_addr, load_stop_addr, entry_point):
@@ -58,20 +114,29 @@ def fake_bload_header(load_start_addr, load_stop_addr, entry_point):
     )
 
 
-def page_loader(page_load_start_addr, page_load_stop_addr, page_entry_point, next_page):
+def page_loader(page_load_start_addr, page_load_stop_addr, page_entry_point, next_page, *, msx_vdp_shadow=True):
+    """Return the loader code and fake BLOAD header at the start of a
+    page. Without `msx_vdp_shadow`, the loader leaves the byte at
+    `MSX_VDP_REGISTER_1_SHADOW_ADDR` alone, for pages loaded while a
+    game is running; its code keeps the same layout."""
     rom_entry_point = ROM_START_ADDR + 0x0010
     payload_start_addr = ROM_START_ADDR + PAGE_LOADER_SIZE  # 0x4047
     page_load_start_addr_storage_addr = payload_start_addr - 6  # 0x4041
     page_load_stop_addr_storage_addr = payload_start_addr - 4  # 0x4043
     page_entry_point_storage_addr = payload_start_addr - 2  # 0x4045
     header = n60_rom_header(rom_entry_point)
+    set_msx_vdp_shadow = (
+        Z80["LD_A_mem"](MSX_VDP_REGISTER_1_SHADOW_ADDR)
+        + Z80["AND_immed"](0xFC)
+        + Z80["OR_immed"](0x02)
+        + Z80["LD_mem_A"](MSX_VDP_REGISTER_1_SHADOW_ADDR)
+    )
+    if not msx_vdp_shadow:
+        set_msx_vdp_shadow = len(set_msx_vdp_shadow) * Z80["NOP"]()
     loader = (
         header
         + 18 * Z80["NOP"]()
-        + Z80["LD_A_mem"](0xF3E0)  # MSX VDP register 1 shadow (no effect on PC-6001)
-        + Z80["AND_immed"](0xFC)
-        + Z80["OR_immed"](0x02)
-        + Z80["LD_mem_A"](0xF3E0)  # MSX VDP register 1 shadow (no effect on PC-6001)
+        + set_msx_vdp_shadow
         + 3 * Z80["NOP"]()
         + Z80["LD_DE_mem"](page_load_start_addr_storage_addr)
         + Z80["XOR_A"]()
@@ -104,91 +169,902 @@ TRAMPOLINE_START_ADDR = 0xC800
 PC6001_MK2_BANK_SWITCH_REGISTER_0_PORT = 0xF0
 
 
-def mkrom(*, payload, load_start_addr, load_stop_addr, entry_point):
-    block_size = ROM_PAGE_SIZE - len(page_loader(0, 0, 0, 1))
-    data_addr = load_start_addr
-    next_page = 1
-    trampoline = (
+def trampoline(entry_point):
+    return (
         Z80["LD_A_immed"](0xDD)  # PC-6001 mkII internal RAM for all 64K
         + Z80["OUT_immed_A"](PC6001_MK2_BANK_SWITCH_REGISTER_0_PORT)
         + Z80["JP_addr"](entry_point)
         + 9 * Z80["NOP"]()
     )
+
+
+def payload_pages(
+    *,
+    payload,
+    load_start_addr,
+    first_page,
+    last_entry_point=TRAMPOLINE_START_ADDR,
+    msx_vdp_shadow=True,
+):
+    """Return the ROM pages, starting at page number `first_page`,
+    which copy `payload` to RAM at `load_start_addr` and then jump to
+    `last_entry_point` (by default, the trampoline). Every page loader
+    changes the byte at `MSX_VDP_REGISTER_1_SHADOW_ADDR` before its
+    copy, unless made without `msx_vdp_shadow`, so the block holding
+    that byte is loaded last."""
+    block_size = ROM_PAGE_SIZE - len(page_loader(0, 0, 0, 1))
+    blocks = [
+        (offset, min(block_size, len(payload) - offset))
+        for offset in range(0, len(payload), block_size)
+    ]
+    blocks.sort(
+        key=lambda block: 0
+        <= MSX_VDP_REGISTER_1_SHADOW_ADDR - (load_start_addr + block[0])
+        < block[1]
+    )
+    next_page = first_page
+    pages = b""
+    for i, (offset, data_length) in enumerate(blocks):
+        block_entry_point = PAGE_LOADER_CONTINUATION_ENTRY_POINT
+        if i == len(blocks) - 1:
+            block_entry_point = last_entry_point
+        next_page += 1
+        pages += page_loader(
+            load_start_addr + offset,
+            load_start_addr + offset + data_length,
+            block_entry_point,
+            next_page,
+            msx_vdp_shadow=msx_vdp_shadow,
+        )
+        pages += payload[offset : offset + data_length]
+        pages += b"\x00" * (block_size - data_length)
+    return pages
+
+
+def mkrom(*, payload, load_start_addr, load_stop_addr, entry_point):
+    block_size = ROM_PAGE_SIZE - len(page_loader(0, 0, 0, 1))
+    next_page = 1
+    game_trampoline = trampoline(entry_point)
     rom = page_loader(
         TRAMPOLINE_START_ADDR,
-        TRAMPOLINE_START_ADDR + len(trampoline),
+        TRAMPOLINE_START_ADDR + len(game_trampoline),
         PAGE_LOADER_CONTINUATION_ENTRY_POINT,
         next_page,
     )
-    rom += trampoline
-    rom += b"\x00" * (block_size - len(trampoline))
-    while (data_addr - load_start_addr) < len(payload):
-        block_entry_point = TRAMPOLINE_START_ADDR
-        data_length = len(payload) - (data_addr - load_start_addr)
-        if data_length > block_size:
-            block_entry_point = PAGE_LOADER_CONTINUATION_ENTRY_POINT
-            data_length = block_size
-        pad_length = block_size - data_length
-        next_page += 1
-        rom += page_loader(
-            data_addr, data_addr + data_length, block_entry_point, next_page
-        )
-        rom += payload[data_addr - load_start_addr :][:data_length]
-        rom += b"\x00" * pad_length
-        data_addr += data_length
+    rom += game_trampoline
+    rom += b"\x00" * (block_size - len(game_trampoline))
+    rom += payload_pages(
+        payload=payload, load_start_addr=load_start_addr, first_page=next_page
+    )
     return rom
 
 
+MENU_TRAMPOLINE_SIZE = 0x20
+MENU_START_ADDR = TRAMPOLINE_START_ADDR + MENU_TRAMPOLINE_SIZE
+MENU_SCREEN_ROWS = 16  # PC-6001 text screen, 32 columns by 16 rows
+MENU_GAMES_PER_SCREEN = MENU_SCREEN_ROWS - 1  # one title per row, with the prompt on the last row so nothing scrolls off
+MENU_KEYS = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ"[:MENU_GAMES_PER_SCREEN]
+MENU_NEXT_SCREEN_KEY = b" "
+MENU_MAX_GAMES = 0xFF  # the menu handles game numbers in A
+MENU_TITLE_WIDTH = 29  # leaves room for the key and a space on a 32-column screen
+PAGE_LOADER_BANK_SWITCH_ADDR = PAGE_LOADER_CONTINUATION_ENTRY_POINT + 2  # the OUT in every page loader
+PC6001_BIOS_PUTCHAR = 0x1075  # N60-BASIC: print the character in A
+PC6001_BIOS_GETCHAR = 0x0FBC  # N60-BASIC: wait for a key and return it in A
+MAX_ROM_PAGES = 0x100  # page numbers are written to BELUGA_BANK_C_SWITCH_PORT as a byte
+
+
+def menu_title(name):
+    from nontama_to_bload import encode_pc6001_8bit_charset
+
+    title = b""
+    for ch in name.replace("_", " ").strip():
+        try:
+            title += encode_pc6001_8bit_charset(ch)
+        except UnicodeEncodeError:
+            title += b"?"
+    return title[:MENU_TITLE_WIDTH]
+
+
+def menu_trampoline(entry_point, tail):
+    """Return the trampoline for a game in a menu ROM, which the menu
+    copies to `TRAMPOLINE_START_ADDR`. It first copies the game's tail,
+    given as (ROM page, offset in the page, RAM address, length), to
+    RAM, then starts the game as `trampoline` does."""
+    tail_page, tail_offset, tail_addr, tail_length = tail
+    code = (
+        Z80["LD_A_immed"](tail_page)
+        + Z80["OUT_immed_A"](BELUGA_BANK_C_SWITCH_PORT)
+        + Z80["LD_HL_immed"](ROM_START_ADDR + tail_offset)
+        + Z80["LD_DE_immed"](tail_addr)
+        + Z80["LD_BC_immed"](tail_length)
+        + Z80["LDIR"]()
+        + Z80["LD_A_immed"](0xDD)  # PC-6001 mkII internal RAM for all 64K
+        + Z80["OUT_immed_A"](PC6001_MK2_BANK_SWITCH_REGISTER_0_PORT)
+        + Z80["JP_addr"](entry_point)
+    )
+    return code + (MENU_TRAMPOLINE_SIZE - len(code)) * Z80["NOP"]()
+
+
+MENU_TRAMPOLINE_FORMAT = "<xB2xxHxHxH6xxH"  # tail page, tail address in ROM, tail RAM address, tail length, entry point
+
+
+def menu_program(titles, first_pages, trampolines, labels=None):
+    """Return a boot menu for `MENU_START_ADDR` which lists `titles`
+    one screen at a time (`MENU_NEXT_SCREEN_KEY` shows the next one),
+    waits for a key from `MENU_KEYS`, copies that game's trampoline to
+    RAM and starts its page chain at its first page, or goes straight
+    to the trampoline for games without one (first page 0). The
+    addresses of its tables are stored in `labels`, if given."""
+    screens = [
+        titles[i : i + MENU_GAMES_PER_SCREEN]
+        for i in range(0, len(titles), MENU_GAMES_PER_SCREEN)
+    ]
+    screen_texts = []
+    for screen_number, screen in enumerate(screens):
+        prompt = b"?"
+        if len(screens) > 1:
+            prompt = f"{screen_number + 1}/{len(screens)} SPACE:MORE ?".encode()
+        screen_texts += [
+            f"screen_text_{screen_number}",
+            b"\x0c"  # clear screen
+            + b"".join(
+                MENU_KEYS[i : i + 1] + b" " + title + b"\r\n"
+                for i, title in enumerate(screen)
+            )
+            + prompt
+            + b"\0",
+        ]
+    return assemble(
+        MENU_START_ADDR,
+        "show_screen",
+        (Z80["LD_A_mem"], "screen"),
+        Z80["LD_L_A"](),
+        Z80["LD_H_immed"](0),
+        Z80["ADD_HL_HL"](),
+        (Z80["LD_DE_immed"], "screen_texts"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_E_HL_ind"](),
+        Z80["INC_HL"](),
+        Z80["LD_D_HL_ind"](),
+        Z80["EX_DE_HL"](),
+        "print",
+        Z80["LD_A_HL_ind"](),
+        Z80["OR_A"](),
+        (Z80["JR_Z_index"], "read_key"),
+        Z80["PUSH_HL"](),
+        Z80["CALL_addr"](PC6001_BIOS_PUTCHAR),
+        Z80["POP_HL"](),
+        Z80["INC_HL"](),
+        (Z80["JR_index"], "print"),
+        "read_key",
+        Z80["CALL_addr"](PC6001_BIOS_GETCHAR),
+        Z80["CP_immed"](MENU_NEXT_SCREEN_KEY[0]),
+        (Z80["JR_Z_index"], "next_screen"),
+        Z80["LD_C_A"](),
+        (Z80["LD_A_mem"], "screen"),
+        Z80["LD_E_A"](),
+        Z80["LD_D_immed"](0),
+        (Z80["LD_HL_immed"], "screen_sizes"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_B_HL_ind"](),
+        (Z80["LD_HL_immed"], "screen_first_games"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_E_HL_ind"](),
+        Z80["LD_A_C"](),
+        (Z80["LD_HL_immed"], "menu_keys"),
+        "find_key",
+        Z80["CP_HL_ind"](),
+        (Z80["JR_Z_index"], "start_game"),
+        Z80["INC_HL"](),
+        Z80["INC_E"](),
+        (Z80["DJNZ_index"], "find_key"),
+        (Z80["JR_index"], "read_key"),
+        "start_game",
+        Z80["LD_A_E"](),
+        Z80["LD_L_A"](),
+        Z80["LD_H_immed"](0),
+        5 * Z80["ADD_HL_HL"](),  # MENU_TRAMPOLINE_SIZE bytes per trampoline
+        (Z80["LD_DE_immed"], "trampolines"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_DE_immed"](TRAMPOLINE_START_ADDR),
+        Z80["LD_BC_immed"](MENU_TRAMPOLINE_SIZE),
+        Z80["LDIR"](),
+        Z80["LD_E_A"](),
+        Z80["LD_D_immed"](0),
+        (Z80["LD_HL_immed"], "first_pages"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_A_HL_ind"](),
+        Z80["OR_A"](),
+        Z80["JP_Z_addr"](TRAMPOLINE_START_ADDR),
+        Z80["JP_addr"](PAGE_LOADER_BANK_SWITCH_ADDR),
+        "next_screen",
+        (Z80["LD_A_mem"], "screen"),
+        Z80["INC_A"](),
+        Z80["CP_immed"](len(screens)),
+        (Z80["JR_NZ_index"], "store_screen"),
+        Z80["XOR_A"](),
+        "store_screen",
+        (Z80["LD_mem_A"], "screen"),
+        (Z80["JR_index"], "show_screen"),
+        "screen",
+        b"\x00",
+        "screen_texts",
+        *((Z80["DEFW"], f"screen_text_{i}") for i in range(len(screens))),
+        *screen_texts,
+        "screen_sizes",
+        bytes(len(screen) for screen in screens),
+        "screen_first_games",
+        bytes(range(0, len(titles), MENU_GAMES_PER_SCREEN)),
+        "menu_keys",
+        MENU_KEYS,
+        "trampolines",
+        b"".join(trampolines),
+        "first_pages",
+        bytes(first_pages),
+        labels=labels,
+    )
+
+
+def mkmenurom(games):
+    """Pack `games` (as returned by `read_bload_file`) into one
+    cartridge behind a boot menu. Each game's payload is split into
+    full blocks, loaded by a page chain of their own, and a tail of up
+    to one block, which its trampoline copies to RAM. The tails share
+    pages, packed first fit decreasing, starting with the free space
+    after the menu on page 0. Returns the ROM, a list of (name, first
+    page, page count, tail page, tail offset, payload size) per game
+    (first page 0 if it has no page chain), and the menu's label
+    addresses."""
+    assert (
+        0 < len(games) <= MENU_MAX_GAMES
+    ), f"A menu can hold 1 to {MENU_MAX_GAMES} games, not {len(games)}"
+    block_size = ROM_PAGE_SIZE - PAGE_LOADER_SIZE
+    titles = [menu_title(game["name"]) for game in games]
+    menu_size = len(  # only the contents of its tables depend on the layout
+        menu_program(titles, len(games) * [0], len(games) * [menu_trampoline(0, (0, 0, 0, 1))])
+    )
+    assert (
+        menu_size <= block_size
+    ), f"Menu is too large for its page (0x{menu_size:04X} bytes), put fewer games on one cartridge"
+    pages = b""
+    first_pages, tail_lengths = [], []
+    for game in games:
+        payload = game["payload"]
+        tail_length = (len(payload) - 1) % block_size + 1
+        first_page = 0
+        if len(payload) > tail_length:
+            first_page = 1 + len(pages) // ROM_PAGE_SIZE
+            pages += payload_pages(
+                payload=payload[:-tail_length],
+                load_start_addr=game["load_start_addr"],
+                first_page=first_page,
+            )
+        first_pages.append(first_page)
+        tail_lengths.append(tail_length)
+    tail_pages = [[0, PAGE_LOADER_SIZE + menu_size, bytearray()]]  # page, offset of its free space, its tails
+    tails = len(games) * [None]
+    for i in sorted(range(len(games)), key=lambda i: -tail_lengths[i]):
+        tail_page = next(
+            (tail_page for tail_page in tail_pages if tail_page[1] + tail_lengths[i] <= ROM_PAGE_SIZE),
+            None,
+        )
+        if tail_page is None:
+            tail_page = [1 + len(pages) // ROM_PAGE_SIZE + len(tail_pages) - 1, 0, bytearray()]
+            tail_pages.append(tail_page)
+        game = games[i]
+        tails[i] = (
+            tail_page[0],
+            tail_page[1],
+            game["load_start_addr"] + len(game["payload"]) - tail_lengths[i],
+            tail_lengths[i],
+        )
+        tail_page[1] += tail_lengths[i]
+        tail_page[2] += game["payload"][-tail_lengths[i] :]
+    labels = {}
+    menu = menu_program(
+        titles,
+        first_pages,
+        [menu_trampoline(game["entry_point"], tail) for game, tail in zip(games, tails)],
+        labels=labels,
+    )
+    rom = page_loader(MENU_START_ADDR, MENU_START_ADDR + len(menu), MENU_START_ADDR, 0)
+    rom += menu
+    rom += tail_pages[0][2]
+    rom += b"\x00" * (ROM_PAGE_SIZE - len(rom))
+    rom += pages
+    for _, _, tail_page_data in tail_pages[1:]:
+        rom += tail_page_data
+        rom += b"\x00" * (ROM_PAGE_SIZE - len(tail_page_data))
+    assert (
+        len(rom) // ROM_PAGE_SIZE <= MAX_ROM_PAGES
+    ), f"Too many pages for one cartridge: 0x{len(rom) // ROM_PAGE_SIZE:X} > 0x{MAX_ROM_PAGES:X}"
+    layout = [
+        (
+            game["name"],
+            first_page,
+            (len(game["payload"]) - tail[3]) // block_size,
+            tail[0],
+            tail[1],
+            len(game["payload"]),
+        )
+        for game, first_page, tail in zip(games, first_pages, tails)
+    ]
+    return rom, layout, labels
+
+
+RAM_SIZE = 0x10000
+TRAMPOLINE_ENTRY_POINT_OFFSET = (
+    len(Z80["LD_A_immed"](0) + Z80["OUT_immed_A"](0)) + 1
+)  # operand of the trampoline's JP
+
+
+def walk_rom(rom, *, first_page=0, ram=None):
+    """Follow the page loader chain of `rom` from `first_page` the way
+    the Z80 code does: check that each page's loader code is what
+    `page_loader` makes for its fake BLOAD header and next page (with
+    or without `msx_vdp_shadow`), change the byte at
+    `MSX_VDP_REGISTER_1_SHADOW_ADDR` if the loader does,
+    copy the page's block to RAM as given by that header, then either
+    continue with the next page or stop at its entry point. Returns
+    the RAM image, a mask of the RAM bytes copied by the loaders and
+    the address finally jumped to."""
+    ram = bytearray(RAM_SIZE) if ram is None else ram
+    written = bytearray(RAM_SIZE)
+    header_offset = PAGE_LOADER_SIZE - len(fake_bload_header(0, 0, 0))
+    page = first_page
+    for _ in range(len(rom) // ROM_PAGE_SIZE):
+        page_data = rom[page * ROM_PAGE_SIZE : (page + 1) * ROM_PAGE_SIZE]
+        assert (
+            len(page_data) == ROM_PAGE_SIZE
+        ), f"page 0x{page:02X}: past the end of the ROM"
+        assert (
+            page_data[header_offset : header_offset + 1] == FAKE_BLOAD_MAGIC
+        ), f"page 0x{page:02X}: missing fake BLOAD header"
+        start_addr, stop_addr, entry_point = struct.unpack_from(
+            "<HHH", page_data, header_offset + 1
+        )
+        next_page = page_data[PAGE_LOADER_CONTINUATION_ENTRY_POINT - ROM_START_ADDR + 1]
+        expected_loader = page_loader(start_addr, stop_addr, entry_point, next_page)
+        msx_vdp_shadow = page_data[:PAGE_LOADER_SIZE] == expected_loader
+        if not msx_vdp_shadow and page_data[:PAGE_LOADER_SIZE] != page_loader(
+            start_addr, stop_addr, entry_point, next_page, msx_vdp_shadow=False
+        ):
+            mismatch_offset = next(
+                i
+                for i, (byt, expected_byt) in enumerate(zip(page_data, expected_loader))
+                if byt != expected_byt
+            )
+            assert (
+                False
+            ), f"page 0x{page:02X}: page loader code differs at 0x{ROM_START_ADDR + mismatch_offset:04X}"
+        assert (
+            start_addr < stop_addr
+            and PAGE_LOADER_SIZE + stop_addr - start_addr <= ROM_PAGE_SIZE
+        ), f"page 0x{page:02X}: bad block 0x{start_addr:04X}-0x{stop_addr:04X}"
+        if msx_vdp_shadow:
+            ram[MSX_VDP_REGISTER_1_SHADOW_ADDR] = (ram[MSX_VDP_REGISTER_1_SHADOW_ADDR] & 0xFC) | 0x02
+        ram[start_addr:stop_addr] = page_data[
+            PAGE_LOADER_SIZE : PAGE_LOADER_SIZE + stop_addr - start_addr
+        ]
+        written[start_addr:stop_addr] = b"\x01" * (stop_addr - start_addr)
+        if entry_point != PAGE_LOADER_CONTINUATION_ENTRY_POINT:
+            return ram, written, entry_point
+        page = next_page
+    assert False, f"page loader chain from page 0x{first_page:02X} does not end"
+
+
+def verify_rom(rom, *, payload, load_start_addr, entry_point, first_page=0, ram=None):
+    """Check that running the page loader chain of `rom` from
+    `first_page` leaves `payload` at `load_start_addr` in RAM and ends
+    with the trampoline jumping to `entry_point`."""
+    ram, written, jump_addr = walk_rom(rom, first_page=first_page, ram=ram)
+    assert (
+        jump_addr == TRAMPOLINE_START_ADDR
+    ), f"page loader chain ends at 0x{jump_addr:04X} instead of the trampoline"
+    trampoline_entry_point = struct.unpack_from(
+        "<H", ram, TRAMPOLINE_START_ADDR + TRAMPOLINE_ENTRY_POINT_OFFSET
+    )[0]
+    assert (
+        ram[TRAMPOLINE_START_ADDR:][: len(trampoline(0))]
+        == trampoline(trampoline_entry_point)
+    ), f"trampoline at 0x{TRAMPOLINE_START_ADDR:04X} was overwritten"
+    assert (
+        trampoline_entry_point == entry_point
+    ), f"trampoline jumps to 0x{trampoline_entry_point:04X} instead of 0x{entry_point:04X}"
+    verify_ram(ram, written, payload=payload, load_start_addr=load_start_addr)
+
+
+def verify_ram(ram, written, *, payload, load_start_addr):
+    """Check that `walk_rom` loaded all of `payload` into `ram` at
+    `load_start_addr`."""
+    load_stop_addr = load_start_addr + len(payload)
+    assert (
+        written.find(0, load_start_addr, load_stop_addr) < 0
+    ), f"RAM at 0x{written.find(0, load_start_addr, load_stop_addr):04X} is never loaded"
+    if ram[load_start_addr:load_stop_addr] != payload:
+        mismatch_addr = next(
+            load_start_addr + i
+            for i, (byt, expected_byt) in enumerate(
+                zip(ram[load_start_addr:load_stop_addr], payload)
+            )
+            if byt != expected_byt
+        )
+        assert False, f"RAM at 0x{mismatch_addr:04X} does not match the payload"
+
+
+def run_menu_trampoline(rom, ram, written, *, entry_point):
+    """Check that the menu trampoline in `ram` is intact and jumps to
+    `entry_point`, and copy its tail from `rom` to `ram`, as it does."""
+    tail_page, tail_src, tail_addr, tail_length, trampoline_entry_point = struct.unpack_from(
+        MENU_TRAMPOLINE_FORMAT, ram, TRAMPOLINE_START_ADDR
+    )
+    tail_offset = (tail_src - ROM_START_ADDR) & 0xFFFF
+    assert (
+        ram[TRAMPOLINE_START_ADDR:][:MENU_TRAMPOLINE_SIZE]
+        == menu_trampoline(trampoline_entry_point, (tail_page, tail_offset, tail_addr, tail_length))
+    ), f"trampoline at 0x{TRAMPOLINE_START_ADDR:04X} was overwritten"
+    assert (
+        tail_offset + tail_length <= ROM_PAGE_SIZE
+        and (tail_page + 1) * ROM_PAGE_SIZE <= len(rom)
+        and tail_addr + tail_length <= RAM_SIZE
+    ), f"tail 0x{tail_length:04X} bytes at page 0x{tail_page:02X} offset 0x{tail_offset:04X} is outside the ROM or RAM"
+    assert (
+        tail_addr + tail_length <= TRAMPOLINE_START_ADDR
+        or tail_addr >= TRAMPOLINE_START_ADDR + MENU_TRAMPOLINE_SIZE
+    ), f"tail at 0x{tail_addr:04X}-0x{tail_addr + tail_length:04X} overwrites the trampoline at 0x{TRAMPOLINE_START_ADDR:04X}"
+    tail_rom_offset = tail_page * ROM_PAGE_SIZE + tail_offset
+    ram[tail_addr : tail_addr + tail_length] = rom[tail_rom_offset : tail_rom_offset + tail_length]
+    written[tail_addr : tail_addr + tail_length] = b"\x01" * tail_length
+    assert (
+        trampoline_entry_point == entry_point
+    ), f"trampoline jumps to 0x{trampoline_entry_point:04X} instead of 0x{entry_point:04X}"
+
+
+def verify_menu_rom(menu_rom, games, labels):
+    """Check the boot page of `menu_rom` and, for each of `games`,
+    that copying its trampoline from the menu's table in RAM, running
+    the page chain from the first page in the menu's table (if any)
+    and then the trampoline, as the menu does, loads it. `labels` are
+    the menu's label addresses from `mkmenurom`."""
+    menu_ram, _, jump_addr = walk_rom(menu_rom)
+    assert (
+        jump_addr == MENU_START_ADDR
+    ), f"boot page jumps to 0x{jump_addr:04X} instead of the menu"
+    for i, game in enumerate(games):
+        ram = bytearray(menu_ram)
+        ram[TRAMPOLINE_START_ADDR : TRAMPOLINE_START_ADDR + MENU_TRAMPOLINE_SIZE] = menu_ram[
+            labels["trampolines"] + i * MENU_TRAMPOLINE_SIZE :
+        ][:MENU_TRAMPOLINE_SIZE]
+        written = bytearray(RAM_SIZE)
+        first_page = menu_ram[labels["first_pages"] + i]
+        try:
+            if first_page:
+                ram, written, jump_addr = walk_rom(menu_rom, first_page=first_page, ram=ram)
+                assert (
+                    jump_addr == TRAMPOLINE_START_ADDR
+                ), f"page loader chain ends at 0x{jump_addr:04X} instead of the trampoline"
+            run_menu_trampoline(menu_rom, ram, written, entry_point=game["entry_point"])
+            verify_ram(
+                ram,
+                written,
+                payload=game["payload"],
+                load_start_addr=game["load_start_addr"],
+            )
+        except AssertionError as e:
+            raise AssertionError(f"{game['name']}: {e}") from e
+
+
+PC6001_MK2_RAM_AND_CARTRIDGE = 0x7D  # bank switch register 0: internal RAM at 0x0000-0x3FFF, cartridge ROM at 0x4000-0x7FFF
+STAGE_LOADER_ADDR = TRAMPOLINE_START_ADDR
+
+
+def stage_loader(first_pages, entry_points, labels=None):
+    """Return the stage loader for `STAGE_LOADER_ADDR`, which takes
+    the place of the trampoline in a multi-load ROM and stays in RAM
+    while the game runs. A game loads its stage number A (counting
+    from 0) with `LD A,stage` / `JP STAGE_LOADER_ADDR`: the stage
+    loader maps the cartridge back in, runs the stage's page chain,
+    maps RAM back in and jumps to the stage's entry point. Page 0
+    enters at `boot` to load stage 0 with the BASIC ROM still mapped
+    in, as single-load ROMs do."""
+    return assemble(
+        STAGE_LOADER_ADDR,
+        "stage_loader",
+        Z80["DI"](),
+        (Z80["LD_mem_A"], "stage"),
+        Z80["LD_E_A"](),
+        Z80["LD_D_immed"](0),
+        (Z80["LD_HL_immed"], "first_pages"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_A_immed"](PC6001_MK2_RAM_AND_CARTRIDGE),
+        Z80["OUT_immed_A"](PC6001_MK2_BANK_SWITCH_REGISTER_0_PORT),
+        Z80["LD_A_HL_ind"](),
+        Z80["JP_addr"](PAGE_LOADER_BANK_SWITCH_ADDR),
+        "boot",
+        Z80["XOR_A"](),
+        (Z80["LD_mem_A"], "stage"),
+        (Z80["LD_A_mem"], "first_pages"),
+        Z80["JP_addr"](PAGE_LOADER_BANK_SWITCH_ADDR),
+        "stage_entry",  # the last page of every stage jumps here
+        Z80["LD_A_immed"](0xDD),  # PC-6001 mkII internal RAM for all 64K
+        Z80["OUT_immed_A"](PC6001_MK2_BANK_SWITCH_REGISTER_0_PORT),
+        (Z80["LD_A_mem"], "stage"),
+        Z80["LD_L_A"](),
+        Z80["LD_H_immed"](0),
+        Z80["ADD_HL_HL"](),
+        (Z80["LD_DE_immed"], "entry_points"),
+        Z80["ADD_HL_DE"](),
+        Z80["LD_E_HL_ind"](),
+        Z80["INC_HL"](),
+        Z80["LD_D_HL_ind"](),
+        Z80["EX_DE_HL"](),
+        Z80["EI"](),  # takes effect after the JP, as the game expects after its tape loader
+        Z80["JP_HL"](),
+        "stage",
+        b"\x00",
+        "first_pages",
+        bytes(first_pages),
+        "entry_points",
+        b"".join(struct.pack("<H", entry_point) for entry_point in entry_points),
+        "stage_loader_end",
+        labels=labels,
+    )
+
+
+def mkmultiloadrom(loads):
+    """Lay out all `loads` of one tape (as returned by
+    `read_bload_file`, in tape order) in one ROM behind a stage
+    loader. Later stages load while the game is running, so the stage
+    pages leave the byte at `MSX_VDP_REGISTER_1_SHADOW_ADDR` alone.
+    Returns the ROM and the stage loader's label addresses."""
+    block_size = ROM_PAGE_SIZE - PAGE_LOADER_SIZE
+    labels = {}
+    stage_loader(len(loads) * [0], len(loads) * [0], labels=labels)  # only the table contents change below
+    pages, first_pages = b"", []
+    for load in loads:
+        load_stop_addr = load["load_start_addr"] + len(load["payload"])
+        assert (
+            load_stop_addr <= STAGE_LOADER_ADDR
+            or load["load_start_addr"] >= labels["stage_loader_end"]
+        ), f"{load['name']}: 0x{load['load_start_addr']:04X}-0x{load_stop_addr:04X} overlaps the stage loader at 0x{STAGE_LOADER_ADDR:04X}-0x{labels['stage_loader_end']:04X}"
+        first_page = 1 + len(pages) // ROM_PAGE_SIZE
+        first_pages.append(first_page)
+        pages += payload_pages(
+            payload=load["payload"],
+            load_start_addr=load["load_start_addr"],
+            first_page=first_page,
+            last_entry_point=labels["stage_entry"],
+            msx_vdp_shadow=False,
+        )
+    loader = stage_loader(first_pages, [load["entry_point"] for load in loads])
+    assert len(loader) <= block_size
+    rom = page_loader(
+        STAGE_LOADER_ADDR, STAGE_LOADER_ADDR + len(loader), labels["boot"], 1
+    )
+    rom += loader
+    rom += b"\x00" * (block_size - len(loader))
+    rom += pages
+    assert (
+        len(rom) // ROM_PAGE_SIZE <= MAX_ROM_PAGES
+    ), f"Too many pages for one cartridge: 0x{len(rom) // ROM_PAGE_SIZE:X} > 0x{MAX_ROM_PAGES:X}"
+    return rom, labels
+
+
+def verify_multiload_rom(rom, loads, labels):
+    """Check that the boot page of the multi-load `rom` installs the
+    stage loader, then run the stages one after another in the same
+    RAM, as a game would, checking that each stage's page chain loads
+    its payload and ends at the stage loader, with the whole stage
+    loader, tables included, left intact, and with the running game's
+    byte at `MSX_VDP_REGISTER_1_SHADOW_ADDR` unchanged unless the stage
+    loads it."""
+    ram, _, jump_addr = walk_rom(rom)
+    assert (
+        jump_addr == labels["boot"]
+    ), f"boot page jumps to 0x{jump_addr:04X} instead of the stage loader"
+    stage_loader_image = bytearray(
+        ram[STAGE_LOADER_ADDR : labels["stage_loader_end"]]
+    )
+    for stage, load in enumerate(loads):
+        ram[labels["stage"]] = stage  # as stored by the stage loader (or by boot, for stage 0)
+        stage_loader_image[labels["stage"] - STAGE_LOADER_ADDR] = stage
+        msx_vdp_shadow = ram[MSX_VDP_REGISTER_1_SHADOW_ADDR]
+        ram, written, jump_addr = walk_rom(
+            rom, first_page=ram[labels["first_pages"] + stage], ram=ram
+        )
+        try:
+            assert (
+                jump_addr == labels["stage_entry"]
+            ), f"page loader chain ends at 0x{jump_addr:04X} instead of the stage loader"
+            assert (
+                ram[STAGE_LOADER_ADDR : labels["stage_loader_end"]]
+                == stage_loader_image
+            ), f"stage loader at 0x{STAGE_LOADER_ADDR:04X}-0x{labels['stage_loader_end']:04X} was overwritten"
+            assert (
+                written[MSX_VDP_REGISTER_1_SHADOW_ADDR]
+                or ram[MSX_VDP_REGISTER_1_SHADOW_ADDR] == msx_vdp_shadow
+            ), f"page loaders changed RAM at 0x{MSX_VDP_REGISTER_1_SHADOW_ADDR:04X}"
+            assert struct.unpack_from(
+                "<H", ram, labels["entry_points"] + 2 * stage
+            )[0] == load["entry_point"], "stage loader has the wrong entry point"
+            verify_ram(
+                ram,
+                written,
+                payload=load["payload"],
+                load_start_addr=load["load_start_addr"],
+            )
+        except AssertionError as e:
+            raise AssertionError(f"{load['name']}: {e}") from e
+
+
 NONTAMA_BLOAD_FILE_NAME_PATTERN = "*_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F]_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F]_[0-9a-fA-F][0-9a-fA-F][0-9a-fA-F][0-9a-fA-F].[Bb][Ii][In]"
 NONTAMA_BLOAD_FILE_NAME_PATTERN_DESCRIPTION = "'*_XXXX_YYYY_ZZZZ.bin' where XXXX is hexadecimal load start address, YYYY is hexadecimal load stop address, and ZZZZ is hexadecimal entry point"
 
 
+def read_bload_file(input_file_path, *, name_pattern_re=None):
+    """Read and check the BLOAD file `input_file_path` named according
+    to nontama_to_bload conventions, and return its game name (the
+    file name without the address suffix), payload and addresses."""
+    if name_pattern_re is None:
+        import fnmatch
+        import re
+
+        name_pattern_re = re.compile(fnmatch.translate(NONTAMA_BLOAD_FILE_NAME_PATTERN))
+    assert os.path.exists(
+        input_file_path
+    ), f"{input_file_path}: input file does not exist"
+    input_file_name = os.path.basename(input_file_path)
+    assert name_pattern_re.match(
+        input_file_name
+    ), f"{input_file_name}: input file must be named according to nontama_to_bload conventions: {NONTAMA_BLOAD_FILE_NAME_PATTERN_DESCRIPTION}"
+    load_start_addr, load_stop_addr, entry_point = (
+        int(hexaddr, 16)
+        for hexaddr in os.path.splitext(input_file_name)[0].split("_")[-3:]
+    )
+    assert load_start_addr < load_stop_addr
+    expected_length = 4 + (load_stop_addr - load_start_addr)
+    bload_data = open(input_file_path, "rb").read()
+    assert (
+        len(bload_data) == expected_length
+    ), f"{input_file_path}: wrong length, expected 0x{expected_length:04X} from filename but got 0x{len(bload_data):04X}"
+    assert struct.unpack("<HH", bload_data[:4]) == (
+        load_start_addr,
+        load_stop_addr,
+    ), f"{input_file_path}: filename suffix and BLOAD header do not match"
+    return dict(
+        name="_".join(os.path.splitext(input_file_name)[0].split("_")[:-3]),
+        payload=bload_data[4:],
+        load_start_addr=load_start_addr,
+        load_stop_addr=load_stop_addr,
+        entry_point=entry_point,
+    )
+
+
+def mkrom_file(input_file_path, *, name_pattern_re=None):
+    """Build the Warrior ROM for the BLOAD file `input_file_path` in
+    the current directory and return the ROM's file name."""
+    import build_stamps
+    import output_writer
+
+    game = read_bload_file(input_file_path, name_pattern_re=name_pattern_re)
+    warrior_rom_file_name = game["name"] + "_warrior.rom"
+    stamp_key = build_stamps.build_key("mkrom", input_file_path)
+    input_hash = build_stamps.content_hash(
+        struct.pack("<HH", game["load_start_addr"], game["load_stop_addr"])
+        + game["payload"]
+    )
+    tool_version = build_stamps.tool_version(__file__)
+    if (
+        build_stamps.up_to_date_build(
+            stamp_key, input_hash=input_hash, version=tool_version
+        )
+        is not None
+    ):
+        print(f"{warrior_rom_file_name}: up to date")
+        return warrior_rom_file_name
+    warrior_rom = mkrom(
+        payload=game["payload"],
+        load_start_addr=game["load_start_addr"],
+        load_stop_addr=game["load_stop_addr"],
+        entry_point=game["entry_point"],
+    )
+    verify_rom(
+        warrior_rom,
+        payload=game["payload"],
+        load_start_addr=game["load_start_addr"],
+        entry_point=game["entry_point"],
+    )
+    if output_writer.write_output(warrior_rom_file_name, warrior_rom):
+        print(f"generated {warrior_rom_file_name}")
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=[warrior_rom_file_name],
+        results=warrior_rom_file_name,
+    )
+    return warrior_rom_file_name
+
+
+def verify_rom_file(input_file_path, *, name_pattern_re=None):
+    """Check the existing Warrior ROM for the BLOAD file
+    `input_file_path` against it and return the ROM's file name."""
+    game = read_bload_file(input_file_path, name_pattern_re=name_pattern_re)
+    warrior_rom_file_name = game["name"] + "_warrior.rom"
+    try:
+        verify_rom(
+            open(warrior_rom_file_name, "rb").read(),
+            payload=game["payload"],
+            load_start_addr=game["load_start_addr"],
+            entry_point=game["entry_point"],
+        )
+    except AssertionError as e:
+        raise AssertionError(f"{warrior_rom_file_name}: {e}") from e
+    print(f"verified {warrior_rom_file_name}")
+    return warrior_rom_file_name
+
+
+def games_content_hash(games):
+    """Return the content hash of `games` (as returned by
+    `read_bload_file`), names and addresses included, for the build
+    stamps of ROMs holding several of them."""
+    import build_stamps
+
+    return build_stamps.content_hash(
+        b"".join(
+            game["name"].encode("utf-8")
+            + b"\0"
+            + struct.pack(
+                "<HHH", game["load_start_addr"], game["load_stop_addr"], game["entry_point"]
+            )
+            + game["payload"]
+            for game in games
+        )
+    )
+
+
+def mkmenurom_file(input_file_paths, menu_rom_file_name, *, name_pattern_re=None):
+    """Build a menu cartridge holding the BLOAD files
+    `input_file_paths`, report how full its pages are, and return the
+    ROM's file name."""
+    import build_stamps
+    import nontama_to_bload
+    import output_writer
+
+    games = [
+        read_bload_file(input_file_path, name_pattern_re=name_pattern_re)
+        for input_file_path in input_file_paths
+    ]
+    stamp_key = build_stamps.build_key("mkrom --menu", menu_rom_file_name)
+    input_hash = games_content_hash(games)
+    tool_version = build_stamps.tool_version(__file__, nontama_to_bload.__file__)
+    if (
+        build_stamps.up_to_date_build(
+            stamp_key, input_hash=input_hash, version=tool_version
+        )
+        is not None
+    ):
+        print(f"{menu_rom_file_name}: up to date")
+        return menu_rom_file_name
+    menu_rom, layout, labels = mkmenurom(games)
+    verify_menu_rom(menu_rom, games, labels)
+    for name, first_page, page_count, tail_page, tail_offset, payload_size in layout:
+        pages = "no page chain"
+        if first_page:
+            pages = f"pages 0x{first_page:02X}-0x{first_page + page_count - 1:02X}"
+        print(
+            f"{name}: 0x{payload_size:04X} bytes, {pages}, tail at page 0x{tail_page:02X} offset 0x{tail_offset:04X}"
+        )
+    page_count = len(menu_rom) // ROM_PAGE_SIZE
+    payload_size = sum(layout_entry[-1] for layout_entry in layout)
+    block_size = ROM_PAGE_SIZE - PAGE_LOADER_SIZE
+    print(
+        f"{menu_rom_file_name}: {page_count} pages ({len(menu_rom) // 1024} KiB), {payload_size / len(menu_rom):.1%} game data; separate ROMs would take {sum(1 + (payload_size + block_size - 1) // block_size for *_, payload_size in layout)} pages"
+    )
+    if output_writer.write_output(menu_rom_file_name, menu_rom):
+        print(f"generated {menu_rom_file_name}")
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=[menu_rom_file_name],
+        results=menu_rom_file_name,
+    )
+    return menu_rom_file_name
+
+
+LOAD_INDEX_RE = r"_load(\d+)_"  # nontama_to_bload's suffix for tapes with several loads
+
+
+def mkmultiloadrom_file(input_file_paths, multiload_rom_file_name, *, name_pattern_re=None):
+    """Build a multi-load cartridge holding the BLOAD files
+    `input_file_paths` of one tape, as stages in the order of their
+    `_loadNN` suffixes, and return the ROM's file name."""
+    import re
+
+    import build_stamps
+    import output_writer
+
+    load_indexes = {}
+    for input_file_path in input_file_paths:
+        load_index_match = re.search(LOAD_INDEX_RE, os.path.basename(input_file_path))
+        assert (
+            load_index_match
+        ), f"{input_file_path}: no _loadNN load index in the file name, as nontama_to_bload writes for tapes with several loads"
+        load_indexes[input_file_path] = int(load_index_match[1])
+    input_file_paths = sorted(input_file_paths, key=load_indexes.get)
+    loads = [
+        read_bload_file(input_file_path, name_pattern_re=name_pattern_re)
+        for input_file_path in input_file_paths
+    ]
+    stamp_key = build_stamps.build_key("mkrom --multiload", multiload_rom_file_name)
+    input_hash = games_content_hash(loads)
+    tool_version = build_stamps.tool_version(__file__)
+    if (
+        build_stamps.up_to_date_build(
+            stamp_key, input_hash=input_hash, version=tool_version
+        )
+        is not None
+    ):
+        print(f"{multiload_rom_file_name}: up to date")
+        return multiload_rom_file_name
+    multiload_rom, labels = mkmultiloadrom(loads)
+    verify_multiload_rom(multiload_rom, loads, labels)
+    for stage, load in enumerate(loads):
+        print(
+            f"stage {stage}: {load['name']}, 0x{load['load_start_addr']:04X}-0x{load['load_stop_addr']:04X}, entry point 0x{load['entry_point']:04X}"
+        )
+    print(
+        f"{multiload_rom_file_name}: {len(multiload_rom) // ROM_PAGE_SIZE} pages ({len(multiload_rom) // 1024} KiB); games load stage N with LD A,N / JP 0x{STAGE_LOADER_ADDR:04X}; the stage loader reserves RAM at 0x{STAGE_LOADER_ADDR:04X}-0x{labels['stage_loader_end'] - 1:04X}"
+    )
+    if output_writer.write_output(multiload_rom_file_name, multiload_rom):
+        print(f"generated {multiload_rom_file_name}")
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=[multiload_rom_file_name],
+        results=multiload_rom_file_name,
+    )
+    return multiload_rom_file_name
+
+
 def main():
-    _, *input_file_paths = sys.argv
+    import fnmatch
+    import glob
+    import re
+
+    _, *input_file_paths = (  # usage: python mkrom.py [--menu=MENU.rom|--multiload=TAPE.rom|--verify] [GAME_XXXX_YYYY_ZZZZ.bin ...]  ## writes GAME_warrior.rom per game, or one MENU.rom holding all games, or one TAPE.rom holding all loads of a tape, or checks existing GAME_warrior.rom files
+        sys.argv
+    )
+    verify_only = "--verify" in input_file_paths
+    menu_rom_file_name = None
+    multiload_rom_file_name = None
+    for arg in input_file_paths:
+        if arg.startswith("--menu="):
+            menu_rom_file_name = arg.split("=", 1)[1]
+        elif arg.startswith("--multiload="):
+            multiload_rom_file_name = arg.split("=", 1)[1]
+    input_file_paths = [arg for arg in input_file_paths if not arg.startswith("--")]
     if not input_file_paths:
         input_file_paths = glob.glob(NONTAMA_BLOAD_FILE_NAME_PATTERN)
     assert (
         input_file_paths
     ), f"Did not find any files in the current working directory named according to nontama_to_bload conventions: {NONTAMA_BLOAD_FILE_NAME_PATTERN_DESCRIPTION}"
     name_pattern_re = re.compile(fnmatch.translate(NONTAMA_BLOAD_FILE_NAME_PATTERN))
+    if menu_rom_file_name is not None:
+        mkmenurom_file(input_file_paths, menu_rom_file_name, name_pattern_re=name_pattern_re)
+        return
+    if multiload_rom_file_name is not None:
+        mkmultiloadrom_file(
+            input_file_paths, multiload_rom_file_name, name_pattern_re=name_pattern_re
+        )
+        return
     for input_file_path in input_file_paths:
-        assert os.path.exists(
-            input_file_path
-        ), f"{input_file_path}: input file does not exist"
-        input_file_name = os.path.basename(input_file_path)
-        assert name_pattern_re.match(
-            input_file_name
-        ), f"{input_file_name}: input file must be named according to nontama_to_bload conventions: {NONTAMA_BLOAD_FILE_NAME_PATTERN_DESCRIPTION}"
-        warrior_rom_file_name = (
-            "_".join(os.path.splitext(input_file_name)[0].split("_")[:-3])
-            + "_warrior.rom"
-        )
-        if os.path.exists(warrior_rom_file_name):
-            os.remove(warrior_rom_file_name)
-            print(f"Removed old {warrior_rom_file_name}")
-        load_start_addr, load_stop_addr, entry_point = (
-            int(hexaddr, 16)
-            for hexaddr in os.path.splitext(input_file_name)[0].split("_")[-3:]
-        )
-        assert load_start_addr < load_stop_addr
-        expected_length = 4 + (load_stop_addr - load_start_addr)
-        bload_data = open(input_file_path, "rb").read()
-        assert (
-            len(bload_data) == expected_length
-        ), f"{input_file_path}: wrong length, expected 0x{expected_length:04X} from filename but got 0x{len(bload_data):04X}"
-        assert struct.unpack("<HH", bload_data[:4]) == (
-            load_start_addr,
-            load_stop_addr,
-        ), f"{input_file_path}: filename suffix and BLOAD header do not match"
-        payload = bload_data[4:]
-        warrior_rom = mkrom(
-            payload=payload,
-            load_start_addr=load_start_addr,
-            load_stop_addr=load_stop_addr,
-            entry_point=entry_point,
-        )
-        open(warrior_rom_file_name, "wb").write(warrior_rom)
-        print(f"generated {warrior_rom_file_name}")
+        if verify_only:
+            verify_rom_file(input_file_path, name_pattern_re=name_pattern_re)
+        else:
+            mkrom_file(input_file_path, name_pattern_re=name_pattern_re)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ import os.path
 import sys
 import unicodedata
 
+from tape_input import find_in_buffer, map_input_file
+
 """
 This converts the "M" loader (my name, I don't know what they called it) used in many Hudson Soft / Honeybee Soft MSX tape games to normal MSX BLOAD.
 """
@@ -18,19 +20,38 @@ MSX_CAS_BLOAD_FOOTER_MAGIC = 10 * b"\x00"
 MSX_CAS_ASCII_BASIC_HEADER_MAGIC = 10 * b"\xea"
 
 
+def msx_cas_blocks(cas_data, max_blocks):
+    """
+    Return zero-copy views of (at most `max_blocks` of) the blocks of `cas_data` as split by `MSX_CAS_HEADER`, like `cas_data.split(MSX_CAS_HEADER)[:max_blocks]` but without reading anything past the last returned block.
+    """
+    view = memoryview(cas_data)
+    blocks, block_start = [], 0
+    while len(blocks) < max_blocks:
+        block_end = find_in_buffer(cas_data, MSX_CAS_HEADER, block_start)
+        if block_end < 0:
+            blocks.append(view[block_start:])
+            break
+        blocks.append(view[block_start:block_end])
+        block_start = block_end + len(MSX_CAS_HEADER)
+    return blocks
+
+
 def mload_to_bload(mload_cas_data):
-    assert mload_cas_data.startswith(
-        MSX_CAS_HEADER
+    """
+    Convert the "M" loader tape image `mload_cas_data` to BLOAD and CAS BLOAD data. It may be `bytes`, an `mmap` or a `memoryview`; only the blocks holding the loader header and payload are read from it.
+    """
+    assert (
+        mload_cas_data[: len(MSX_CAS_HEADER)] == MSX_CAS_HEADER
     ), f"This does not appear to be an MSX CAS file (missing header {MSX_CAS_HEADER})"
-    mload_data_blocks = mload_cas_data.split(MSX_CAS_HEADER)
+    mload_data_blocks = msx_cas_blocks(mload_cas_data, 6)
     if (
         len(mload_data_blocks) >= 6
-        and MSX_CAS_ASCII_BASIC_HEADER_MAGIC in mload_data_blocks[1]
+        and MSX_CAS_ASCII_BASIC_HEADER_MAGIC in bytes(mload_data_blocks[1])
     ):
         # elide ASCII BASIC pre-loader
         mload_data_blocks = mload_data_blocks[:1] + mload_data_blocks[3:]
     assert len(mload_data_blocks) >= 4, f"Not enough tape blocks to hold a mload loader"
-    header_block = mload_data_blocks[1]
+    header_block = bytes(mload_data_blocks[1])
     assert (
         len(header_block) >= 16
     ), f"First or second CAS block must contain the mload loader's BLOAD header"
@@ -118,21 +139,40 @@ assert len(MSX_8BIT_ALTCHARSET) == 32
 MSX_8BIT_CHARMAP = {MSX_8BIT_CHARSET[i]: bytes([i]) for i in range(256)} | {
     MSX_8BIT_ALTCHARSET[i]: bytes([0x01, i + 0x40]) for i in range(32)
 }
-MSX_8BIT_CHARMAP_COMPAT = {
-    unicodedata.normalize("NFKD", key): value
-    for key, value in MSX_8BIT_CHARMAP.items()
-    if unicodedata.normalize("NFKD", key) != key
-} | {
-    "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": MSX_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": MSX_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": MSX_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
-    ],
-}
+
+
+_msx_8bit_charmap_compat = None
+
+
+def msx_8bit_charmap_compat():
+    """
+    Build the NFKD-normalized compatibility map on first use rather than at import, since that normalizes every charset entry.
+    """
+    global _msx_8bit_charmap_compat
+    if _msx_8bit_charmap_compat is not None:
+        return _msx_8bit_charmap_compat
+    _msx_8bit_charmap_compat = {
+        unicodedata.normalize("NFKD", key): value
+        for key, value in MSX_8BIT_CHARMAP.items()
+        if unicodedata.normalize("NFKD", key) != key
+    } | {
+        "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": MSX_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
+        ],
+        "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": MSX_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
+        ],
+        "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": MSX_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
+        ],
+    }
+    return _msx_8bit_charmap_compat
+
+
+def __getattr__(name):
+    if name == "MSX_8BIT_CHARMAP_COMPAT":
+        return msx_8bit_charmap_compat()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def encode_msx_8bit_charset(s, try_harder=True):
@@ -157,15 +197,16 @@ def encode_msx_8bit_charset(s, try_harder=True):
             for i in range(len(s))
         ]
     )
+    charmap_compat = msx_8bit_charmap_compat()
     byts, chars_consumed, num_chars = b"", 0, len(s)
     while chars_consumed < num_chars:
         ch = s[chars_consumed]
-        byt = MSX_8BIT_CHARMAP.get(ch, MSX_8BIT_CHARMAP_COMPAT.get(ch)) or (
+        byt = MSX_8BIT_CHARMAP.get(ch, charmap_compat.get(ch)) or (
             bytes([ord(ch)]) if ord(ch) <= 0x7F else None
         )
         if byt is None and try_harder:
             cch = unicodedata.normalize("NFKD", ch)
-            byt = MSX_8BIT_CHARMAP.get(cch, MSX_8BIT_CHARMAP_COMPAT.get(cch)) or (
+            byt = MSX_8BIT_CHARMAP.get(cch, charmap_compat.get(cch)) or (
                 bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
             )
         if byt is None:
@@ -215,15 +256,51 @@ def decode_msx_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
     return s
 
 
-def main():
-    _, infn = (
-        sys.argv
-    )  # usage: python3 mload_to_bload.py [/PATH/TO/]TAPE.cas  ## generates MSX Disk BASIC BLOAD data file ./TAPE_LOAD_XXXX_YYYY_ZZZZ.bin where LOAD is loader name, XXXX is hexadecimal load start address, YYYY is hexadecimal load stop address, and ZZZZ is hexadecimal entry point; also generates MSX CAS file loadable using BLOAD ./TAPE_LOAD_XXXX_YYYY_ZZZZ_bin.cas
-    mload_cas_data = open(infn, "rb").read()
+STRINGS_OPTION = "--strings"
+
+
+def msx_strings(payload, load_addr):
+    """
+    Yield the RAM address and decoded text of every run of printable MSX characters in `payload`, which loads at `load_addr`.
+    """
+    from printable_strings import printable_strings
+
+    return printable_strings(
+        payload,
+        MSX_8BIT_CHARMAP,
+        load_addr,
+    )
+
+
+def convert_tape(infn, mload_cas_data=None, writer=None, on_load=None, input_hash=None):
+    """
+    Convert the "M" loader tape image `infn` (already mapped as `mload_cas_data`, if given) to BLOAD and CAS BLOAD files in the current directory, written by the `OutputWriter` `writer` (by default, a new one). Returns a one-element list, as `nontama_to_bload.convert_tape` does, of a dict with the `outfns`, decoded `load_name`, addresses and `payload_hash`; the BLOAD payload itself is only passed to `on_load(load, payload)`, if given. The build stamp uses `input_hash`, the `build_stamps.content_hash` of the tape image, if the caller has already computed it.
+    """
+    import build_stamps
+    import output_writer
+    import tape_input
+
+    if mload_cas_data is None:
+        mload_cas_data = map_input_file(infn)
+    stamp_key = build_stamps.build_key("mload_to_bload", infn)
+    if input_hash is None:
+        input_hash = build_stamps.content_hash(mload_cas_data)
+    tool_version = build_stamps.tool_version(__file__, tape_input.__file__)
+    loads = build_stamps.up_to_date_build(
+        stamp_key, input_hash=input_hash, version=tool_version
+    )
+    if loads is not None:
+        print(f"{infn}: up to date")
+        if on_load is not None:
+            for load in loads:
+                with open(load["outfns"][0], "rb") as f:
+                    on_load(load, f.read()[7:])
+        return loads
     load_name, load_addr, stop_addr, exe_addr, bload_out, cas_bload_out = (
         mload_to_bload(mload_cas_data)
     )
     load_suffix = ""
+    load_name_unicode = None
     if load_name is not None:
         load_name_unicode = decode_msx_8bit_charset(load_name)
         load_name_fs_safe = ""
@@ -233,17 +310,53 @@ def main():
             load_name_fs_safe += ch
         load_suffix = f"_{load_name_fs_safe}" + load_suffix
     outfn = f"{os.path.splitext(os.path.basename(infn))[0]}{load_suffix}_{load_addr:04X}_{stop_addr:04X}_{exe_addr:04X}.bin"
-    if os.path.exists(outfn):
-        os.remove(outfn)
-        print(f"Removed old {outfn}")
-    print(f"Writing {outfn}")
-    open(outfn, "wb").write(bload_out)
     cas_outfn = f"{os.path.splitext(os.path.basename(infn))[0]}{load_suffix}_{load_addr:04X}_{stop_addr:04X}_{exe_addr:04X}_bin.cas"
-    if os.path.exists(cas_outfn):
-        os.remove(cas_outfn)
-        print(f"Removed old {cas_outfn}")
-    print(f"Writing {cas_outfn}")
-    open(cas_outfn, "wb").write(cas_bload_out)
+    load = dict(
+        outfns=[outfn, cas_outfn],
+        load_name=load_name_unicode,
+        start_addr=load_addr,
+        stop_addr=stop_addr,
+        exe_addr=exe_addr,
+        payload_hash=build_stamps.content_hash(memoryview(bload_out)[7:]),
+    )
+    own_writer = writer is None
+    if own_writer:
+        writer = output_writer.OutputWriter()
+    try:
+        writer.submit(outfn, bload_out)
+        writer.submit(cas_outfn, cas_bload_out)
+        if on_load is not None:
+            on_load(load, memoryview(bload_out)[7:])
+        del bload_out, cas_bload_out
+        writer.wait()
+    finally:
+        if own_writer:
+            writer.close()
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=load["outfns"],
+        results=[load],
+    )
+    return [load]
+
+
+def main():
+    import output_writer
+
+    writer_options, (_, *options, infn) = output_writer.writer_options(
+        sys.argv
+    )  # usage: python3 mload_to_bload.py [--strings] [--write-queue-depth=N] [--fsync] [/PATH/TO/]TAPE.cas  ## generates MSX Disk BASIC BLOAD data file ./TAPE_LOAD_XXXX_YYYY_ZZZZ.bin where LOAD is loader name, XXXX is hexadecimal load start address, YYYY is hexadecimal load stop address, and ZZZZ is hexadecimal entry point; also generates MSX CAS file loadable using BLOAD ./TAPE_LOAD_XXXX_YYYY_ZZZZ_bin.cas; with --strings, also lists the text in the game
+    assert set(options) <= {STRINGS_OPTION}, f"Unknown option(s) {' '.join(options)}"
+
+    def on_load(load, payload):
+        if STRINGS_OPTION in options:
+            for addr, text in msx_strings(payload, load["start_addr"]):
+                print(f"{load['outfns'][0]}: 0x{addr:04X} {text}")
+
+    with output_writer.OutputWriter(**writer_options) as writer:
+        convert_tape(infn, writer=writer, on_load=on_load)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,8 @@
 import os
 import sys
 import unicodedata
-from functools import reduce
+
+from tape_input import find_in_buffer, map_input_file
 
 NONTAMA_HEADER_START = b"\xffNONTAMA"
 NONTAMA_INITIAL_VALUE = 0xA3
@@ -42,26 +43,35 @@ state.
 IHEX_START=b'\r\n:'
 LOAD_NAME_PREFIX=b'Found:'
 
-def nontama_to_bload(b):
+
+def nontama_to_bload(b, offset=0, xor=True):
     """Extract NONTAMA-loader XOR'ed data from the P6/P6T tape
     image `b` and return it un-XOR'ed and converted to `BLOAD`
-    format.
+    format. With `xor=False` the data is taken verbatim, as the
+    PC-8801 variant of the loader stores it.
+
+    `b` may be `bytes`, an `mmap` or a `memoryview`; only the part
+    starting at `offset` is searched, and only the loader, header and
+    payload of the first load found there are copied out. The last
+    value returned is the offset just past that load's payload.
 
     """
-    assert NONTAMA_HEADER_START in b
+    header_pos = find_in_buffer(b, NONTAMA_HEADER_START, offset)
+    assert header_pos >= 0
     import struct
+    from functools import reduce
 
-    start_addr, last_addr, exe_addr = struct.unpack(
-        "<HHH", b[b.find(NONTAMA_HEADER_START) + len(NONTAMA_HEADER_START) :][:6]
+    start_addr, last_addr, exe_addr = struct.unpack_from(
+        "<HHH", b, header_pos + len(NONTAMA_HEADER_START)
     )
     assert start_addr < last_addr
     stop_addr = last_addr + 1
-    payload_start = b.find(NONTAMA_HEADER_START) + len(NONTAMA_HEADER_START) + 6
+    payload_start = header_pos + len(NONTAMA_HEADER_START) + 6
     load_name = None
-    potential_loader = b[:b.find(NONTAMA_HEADER_START)]
-    if IHEX_START in potential_loader:
-        ihex = potential_loader[potential_loader.find(IHEX_START):]
-        ihex = ihex[:ihex.find(b'\0')]
+    ihex_pos = find_in_buffer(b, IHEX_START, offset, header_pos)
+    if ihex_pos >= 0:
+        ihex_end = find_in_buffer(b, b'\0', ihex_pos, header_pos)
+        ihex = bytes(b[ihex_pos:ihex_end if ihex_end >= 0 else header_pos - 1])
         ihex=ihex.rstrip(b'\x1A')
         loader_payload = b""
         loader_addr = None
@@ -98,19 +108,19 @@ def nontama_to_bload(b):
     print(
         f"NONTAMA start_addr=0x{start_addr:04X}, stop_addr=0x{stop_addr:04X}, exe_addr=0x{exe_addr:04X}, load_name={load_name}"
     )
-    ciphertext = b[payload_start:][:stop_addr-start_addr]
+    ciphertext = bytes(b[payload_start:payload_start + stop_addr - start_addr])
     payload = reduce(
         lambda k_p, c: (c, k_p[1] + bytes([k_p[0] ^ c])),
         ciphertext,
         (NONTAMA_INITIAL_VALUE, b""),
-    )[1]
+    )[1] if xor else ciphertext
     return (
         struct.pack("<HH", start_addr, stop_addr) + payload,
         load_name,
         start_addr,
         stop_addr,
         exe_addr,
-        b[payload_start+stop_addr-start_addr:],
+        payload_start + len(ciphertext),
     )
 
 
@@ -152,21 +162,41 @@ assert len(PC6001_8BIT_ALTCHARSET) == 32
 PC6001_8BIT_CHARMAP = {PC6001_8BIT_CHARSET[i]: bytes([i]) for i in range(256)} | {
     PC6001_8BIT_ALTCHARSET[i]: bytes([0x14, i + 0x30]) for i in range(32)
 }
-PC6001_8BIT_CHARMAP_COMPAT = {
-    unicodedata.normalize("NFKD", key): value
-    for key, value in PC6001_8BIT_CHARMAP.items()
-    if unicodedata.normalize("NFKD", key) != key
-} | {
-    "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
-    ],
-}
+
+
+_pc6001_8bit_charmap_compat = None
+
+
+def pc6001_8bit_charmap_compat():
+    """Build the NFKD-normalized compatibility map on first use rather
+    than at import, since that normalizes every charset entry.
+
+    """
+    global _pc6001_8bit_charmap_compat
+    if _pc6001_8bit_charmap_compat is not None:
+        return _pc6001_8bit_charmap_compat
+    _pc6001_8bit_charmap_compat = {
+        unicodedata.normalize("NFKD", key): value
+        for key, value in PC6001_8BIT_CHARMAP.items()
+        if unicodedata.normalize("NFKD", key) != key
+    } | {
+        "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
+        ],
+        "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
+        ],
+        "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": PC6001_8BIT_CHARMAP[
+            "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
+        ],
+    }
+    return _pc6001_8bit_charmap_compat
+
+
+def __getattr__(name):
+    if name == "PC6001_8BIT_CHARMAP_COMPAT":
+        return pc6001_8bit_charmap_compat()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def encode_pc6001_8bit_charset(s, try_harder=True):
@@ -191,20 +221,21 @@ def encode_pc6001_8bit_charset(s, try_harder=True):
             for i in range(len(s))
         ]
     )
+    charmap_compat = pc6001_8bit_charmap_compat()
     byts, chars_consumed, num_chars = b"", 0, len(s)
     while chars_consumed < num_chars:
         ch = s[chars_consumed]
-        byt = PC6001_8BIT_CHARMAP.get(ch, PC6001_8BIT_CHARMAP_COMPAT.get(ch)) or (
+        byt = PC6001_8BIT_CHARMAP.get(ch, charmap_compat.get(ch)) or (
             bytes([ord(ch)]) if ord(ch) <= 0x7F else None
         )
         if byt is None and try_harder:
             cch = unicodedata.normalize("NFKD", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
+            byt = PC6001_8BIT_CHARMAP.get(cch, charmap_compat.get(cch)) or (
                 bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
             )
         if byt is None and try_harder:
             cch = unicodedata.normalize("NFC", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
+            byt = PC6001_8BIT_CHARMAP.get(cch, charmap_compat.get(cch)) or (
                 bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
             )
         if byt is None:
@@ -257,6 +288,21 @@ def decode_pc6001_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
     return s
 
 
+def pc6001_strings(payload, start_addr):
+    """Yield the RAM address and decoded text of every run of
+    printable PC-6001 characters in `payload`, which loads at
+    `start_addr`.
+
+    """
+    from printable_strings import printable_strings
+
+    return printable_strings(
+        payload,
+        PC6001_8BIT_CHARMAP,
+        start_addr,
+    )
+
+
 def smoke_test_pc6001_8bit_charset():
     assert decode_pc6001_8bit_charset(b"") == ""
     assert encode_pc6001_8bit_charset("") == b""
@@ -460,37 +506,197 @@ def smoke_test_pc6001_8bit_charset():
             == expected_result
         ), f"decode_pc6001_8bit_charset(encode_pc6001_8bit_charset({repr(test_data)})) returned:\n {repr(decode_pc6001_8bit_charset(encode_pc6001_8bit_charset(test_data)))}, expecting:\n {repr(expected_result)}"
 
-smoke_test_pc6001_8bit_charset()
+
+SELF_TEST_OPTION = "--self-test"
+MEMORY_MAP_OPTION = "--memory-map"
+STRINGS_OPTION = "--strings"
+RAM_SIZE = 0x10000
+
+
+def convert_tape(infn, p6_in=None, xor=True, writer=None, on_load=None, input_hash=None):
+    """Convert every NONTAMA load on the tape image `infn` (already
+    mapped as `p6_in`, if given) to a BLOAD file in the current
+    directory. Returns a dict per load with its `outfns`, decoded
+    `load_name` (or None), addresses and `payload_hash`. Pass
+    `xor=False` for the PC-8801 variant of the loader, which stores
+    data verbatim. Each BLOAD file is handed to the `OutputWriter`
+    `writer` (by default, a new one) as soon as its load is decoded,
+    and its payload is passed to `on_load(load, payload)`, if given,
+    then dropped, so only one decoded load is held at a time. The
+    build stamp uses `input_hash`, the `build_stamps.content_hash` of
+    the tape image, if the caller has already computed it.
+
+    """
+    import build_stamps
+    import output_writer
+    import tape_input
+
+    if p6_in is None:
+        assert os.path.exists(infn)
+        p6_in = map_input_file(infn)
+    stamp_key = build_stamps.build_key("nontama_to_bload", infn)
+    if input_hash is None:
+        input_hash = build_stamps.content_hash(p6_in)
+    tool_version = build_stamps.tool_version(__file__, tape_input.__file__, xor=xor)
+    loads = build_stamps.up_to_date_build(stamp_key, input_hash=input_hash, version=tool_version)
+    if loads is not None:
+        print(f"{infn}: up to date")
+        if on_load is not None:
+            for load in loads:
+                with open(load['outfns'][0], "rb") as f:
+                    on_load(load, f.read()[4:])
+        return loads
+    own_writer = writer is None
+    if own_writer:
+        writer = output_writer.OutputWriter()
+    try:
+        loads = []
+        offset = 0
+        while True:
+            bload_out, load_name, start_addr, stop_addr, exe_addr, offset = nontama_to_bload(p6_in, offset, xor=xor)
+            last_load = find_in_buffer(p6_in, NONTAMA_HEADER_START, offset) < 0
+            load_suffix = '' if last_load and not loads else f"_load{1 + len(loads):02d}"
+            load_name_unicode = None
+            if load_name is not None:
+                load_name_unicode = decode_pc6001_8bit_charset(load_name)
+                load_name_fs_safe = ''
+                for i, ch in enumerate(load_name_unicode):
+                    if ch in set('"*+,/:;<=>?[\\]|\x7f¥¦') | set(chr(i) for i in range(0x20)):
+                        ch = "_"
+                    load_name_fs_safe += ch
+                load_suffix = f"_{load_name_fs_safe}" + load_suffix
+            outfn = f"{os.path.splitext(os.path.basename(infn))[0]}{load_suffix}_{start_addr:04x}_{stop_addr:04x}_{exe_addr:04x}.bin"
+            writer.submit(outfn, bload_out)
+            load = dict(outfns=[outfn], load_name=load_name_unicode, start_addr=start_addr, stop_addr=stop_addr, exe_addr=exe_addr, payload_hash=build_stamps.content_hash(memoryview(bload_out)[4:]))
+            loads.append(load)
+            if on_load is not None:
+                on_load(load, memoryview(bload_out)[4:])
+            del bload_out
+            if last_load:
+                break
+        writer.wait()
+    finally:
+        if own_writer:
+            writer.close()
+    build_stamps.record_build(
+        stamp_key,
+        input_hash=input_hash,
+        version=tool_version,
+        outfns=[outfn for load in loads for outfn in load['outfns']],
+        results=loads,
+    )
+    return loads
+
+
+def new_memory_map():
+    """Return an empty combined 64K RAM image for `add_to_memory_map`,
+    with its interval index, a sorted list of disjoint (start, stop,
+    load number) ranges telling which load (counting from 1) last
+    wrote each address, and its list of (load number, overwritten load
+    number, start, stop) overlaps."""
+    return dict(image=bytearray(RAM_SIZE), intervals=[], interval_starts=[], overlaps=[], loads=[])
+
+
+def add_to_memory_map(memory_map, load, payload):
+    """Apply the next `load` (as returned by `convert_tape`) in tape
+    order to `memory_map`, with its `payload` as passed to `on_load`.
+    Both the image and the index are updated a whole range at a time,
+    so the cost does not depend on the load size, and only the load's
+    name and addresses are kept.
+
+    """
+    from bisect import bisect_right
+
+    image, intervals, interval_starts = memory_map['image'], memory_map['intervals'], memory_map['interval_starts']
+    memory_map['loads'].append({key: load[key] for key in ('load_name', 'start_addr', 'stop_addr', 'exe_addr')})
+    load_number = len(memory_map['loads'])
+    start_addr, stop_addr = load['start_addr'], load['stop_addr']
+    assert start_addr <= stop_addr <= RAM_SIZE and len(payload) == stop_addr - start_addr, f"load {load_number}: bad range 0x{start_addr:04x}-0x{stop_addr:04x} for 0x{len(payload):04x} bytes"
+    if start_addr == stop_addr:
+        return
+    image[start_addr:stop_addr] = payload
+    first = bisect_right(interval_starts, start_addr) - 1
+    if first < 0 or intervals[first][1] <= start_addr:
+        first += 1
+    last = first
+    replacement = []
+    while last < len(intervals) and intervals[last][0] < stop_addr:
+        other_start, other_stop, other_load_number = intervals[last]
+        memory_map['overlaps'].append((load_number, other_load_number, max(start_addr, other_start), min(stop_addr, other_stop)))
+        if other_start < start_addr:
+            replacement.append((other_start, start_addr, other_load_number))
+        last += 1
+    replacement.append((start_addr, stop_addr, load_number))
+    if last > first and intervals[last - 1][1] > stop_addr:
+        replacement.append((stop_addr, intervals[last - 1][1], intervals[last - 1][2]))
+    intervals[first:last] = replacement
+    interval_starts[first:last] = [interval[0] for interval in replacement]
+
+
+def memory_map_owners(intervals):
+    """Expand the interval index of a memory map to the load
+    number (0 for none) that last wrote each of the 64K addresses."""
+    from array import array
+
+    owners = array('H', bytes(2 * RAM_SIZE))
+    for start_addr, stop_addr, load_number in intervals:
+        owners[start_addr:stop_addr] = array('H', [load_number]) * (stop_addr - start_addr)
+    return owners
+
+
+def write_memory_map(infn, memory_map, writer):
+    """Hand the combined RAM image in `memory_map` of the loads from
+    the tape image `infn` to the `OutputWriter` `writer` for the
+    current directory, along with the load number that last wrote each
+    address from `memory_map_owners`, and print which ranges each load
+    ended up owning and which earlier loads it overwrote. Returns the
+    image's and the owner table's file names."""
+    loads, intervals = memory_map['loads'], memory_map['intervals']
+    outfn = f"{os.path.splitext(os.path.basename(infn))[0]}_memory_map.bin"
+    owners_outfn = f"{os.path.splitext(os.path.basename(infn))[0]}_memory_map_owners.bin"
+    owners = memory_map_owners(intervals)
+    for start_addr, stop_addr, load_number in intervals:
+        load = loads[load_number - 1]
+        print(f"0x{start_addr:04x}-0x{stop_addr:04x}: load {load_number}{'' if load['load_name'] is None else ' ' + load['load_name']}")
+    for load_number, other_load_number, start_addr, stop_addr in memory_map['overlaps']:
+        print(f"load {load_number} overwrites load {other_load_number} at 0x{start_addr:04x}-0x{stop_addr:04x} (0x{stop_addr - start_addr:04x} bytes)")
+    exe_addr = loads[-1]['exe_addr']
+    exe_owner = owners[exe_addr]
+    print(f"exe_addr 0x{exe_addr:04x} is in {f'load {exe_owner}' if exe_owner else 'memory no load wrote'}")
+    writer.submit(outfn, memory_map['image'])
+    if sys.byteorder != 'little':
+        owners.byteswap()
+    writer.submit(owners_outfn, owners.tobytes())
+    return outfn, owners_outfn
+
 
 def main():
-    _, infn = (  # usage: python nontama_to_bload.py INPUT.p6  ## writes OUTPUT[_name][_loadNN]_start_stop_exe.bin
+    _, *args = (  # usage: python nontama_to_bload.py [--memory-map] [--strings] [--write-queue-depth=N] [--fsync] INPUT.p6  ## writes OUTPUT[_name][_loadNN]_start_stop_exe.bin (and OUTPUT_memory_map.bin, the 64K RAM image after all loads, and OUTPUT_memory_map_owners.bin, the load number that last wrote each address; and lists the text in each load)
         sys.argv
     )
-    assert os.path.exists(infn)
-    p6_in = open(infn, "rb").read()
-    results = []
-    while True:
-        bload_out, load_name, start_addr, stop_addr, exe_addr, p6_in = nontama_to_bload(p6_in)
-        results.append(dict(bload_out=bload_out, load_name=load_name, start_addr=start_addr, stop_addr=stop_addr, exe_addr=exe_addr))
-        if not NONTAMA_HEADER_START in p6_in:
-            break
-    for i, result in enumerate(results):
-        bload_out, load_name, start_addr, stop_addr, exe_addr = result['bload_out'], result['load_name'], result['start_addr'], result['stop_addr'], result['exe_addr']
-        load_suffix = '' if len(results) == 1 else f"_load{1 + i:02d}"
-        if load_name is not None:
-            load_name_unicode = decode_pc6001_8bit_charset(load_name)
-            load_name_fs_safe = ''
-            for i, ch in enumerate(load_name_unicode):
-                if ch in set('"*+,/:;<=>?[\\]|\x7f¥¦') | set(chr(i) for i in range(0x20)):
-                    ch = "_"
-                load_name_fs_safe += ch
-            load_suffix = f"_{load_name_fs_safe}" + load_suffix
-        outfn = f"{os.path.splitext(os.path.basename(infn))[0]}{load_suffix}_{start_addr:04x}_{stop_addr:04x}_{exe_addr:04x}.bin"
-        if os.path.exists(outfn):
-            os.remove(outfn)
-            print(f"Removed old {outfn}")
-        print(f"Writing {outfn}")
-        open(outfn, "wb").write(bload_out)
+    if args == [SELF_TEST_OPTION]:  # usage: python nontama_to_bload.py --self-test  ## checks the PC-6001 charset tables
+        smoke_test_pc6001_8bit_charset()
+        print("PC-6001 charset smoke test passed")
+        return
+    import output_writer
+
+    writer_options, args = output_writer.writer_options(args)
+    *options, infn = args
+    known_options = {MEMORY_MAP_OPTION, STRINGS_OPTION}
+    assert set(options) <= known_options, f"Unknown option(s) {' '.join(sorted(set(options) - known_options))}"
+    memory_map = new_memory_map() if MEMORY_MAP_OPTION in options else None
+
+    def on_load(load, payload):
+        if memory_map is not None:
+            add_to_memory_map(memory_map, load, payload)
+        if STRINGS_OPTION in options:
+            for addr, text in pc6001_strings(payload, load['start_addr']):
+                print(f"{load['outfns'][0]}: 0x{addr:04x} {text}")
+
+    with output_writer.OutputWriter(**writer_options) as writer:
+        convert_tape(infn, writer=writer, on_load=on_load)
+        if memory_map is not None:
+            write_memory_map(infn, memory_map, writer)
 
 
 if __name__ == "__main__":
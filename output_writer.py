@@ -0,0 +1,140 @@
+#
+# output_writer - write converter outputs on background threads
+#
+# nontama_to_bload.py and mload_to_bload.py hand each finished output to an OutputWriter, so the next load decodes while earlier outputs are still being written (which matters on network-mounted storage). Every write is atomic (a temporary file renamed over the output), optionally fsync'ed, and skipped when the output already holds the same bytes. At most `queue_depth` outputs are pending at once, so memory use stays bounded: once the queue is full, handing over another output waits for one to finish. Closing the writer reports how long the writes took and how long decoding waited for the queue. `write_output` does the same single write synchronously, for mkrom.py.
+
+import os
+import threading
+import time
+
+WRITE_WORKERS = 2
+WRITE_QUEUE_DEPTH = 4
+WRITE_QUEUE_DEPTH_OPTION = "--write-queue-depth="
+FSYNC_OPTION = "--fsync"
+
+
+def output_unchanged(path, data):
+    """Return whether `path` already holds exactly `data`."""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def atomic_write(path, data, *, fsync=False):
+    """Write `data` to a temporary file next to `path` and rename it
+    over `path`, so readers never see a partly written output. With
+    `fsync`, the data is flushed to the disk before the rename."""
+    temp_file_name = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file_name, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file_name, path)
+    except BaseException:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+
+
+def write_output(path, data, *, fsync=False):
+    """Write `data` to `path`, unless it already holds exactly `data`
+    (which keeps its mtime). Returns whether the file was written."""
+    if output_unchanged(path, data):
+        print(f"Unchanged {path}")
+        return False
+    print(f"Writing {path}")
+    atomic_write(path, data, fsync=fsync)
+    return True
+
+
+class OutputWriter:
+    """Bounded pool of background threads writing outputs with
+    `atomic_write`. Use as a context manager, or call
+    `close` when done."""
+
+    def __init__(self, *, workers=WRITE_WORKERS, queue_depth=WRITE_QUEUE_DEPTH, fsync=False):
+        from concurrent.futures import ThreadPoolExecutor
+
+        assert workers >= 1 and queue_depth >= 1, f"Need at least one write worker and a queue depth of at least one, got {workers} and {queue_depth}"
+        self.fsync = fsync
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="output_writer")
+        self.slots = threading.BoundedSemaphore(queue_depth)
+        self.pending = []  # (path, future) in submission order
+        self.latencies = []
+        self.bytes_written = 0
+        self.queue_wait = 0.0
+
+    def submit(self, path, data):
+        """Queue `data` to be written to `path`, first waiting for a free
+        slot if `queue_depth` writes are already pending."""
+        started = time.perf_counter()
+        self.slots.acquire()
+        self.queue_wait += time.perf_counter() - started
+        try:
+            future = self.executor.submit(self._write, path, bytes(data), time.perf_counter())
+        except BaseException:
+            self.slots.release()
+            raise
+        self.pending.append((path, future))
+
+    def _write(self, path, data, submitted):
+        try:
+            if output_unchanged(path, data):
+                return False, time.perf_counter() - submitted, 0
+            atomic_write(path, data, fsync=self.fsync)
+            return True, time.perf_counter() - submitted, len(data)
+        finally:
+            self.slots.release()
+
+    def wait(self):
+        """Wait for every queued write, report each in submission order
+        and return their paths. Raises the first write error, if any."""
+        pending, self.pending = self.pending, []
+        paths = []
+        for path, future in pending:
+            written, latency, byte_count = future.result()
+            print(f"{'Writing' if written else 'Unchanged'} {path}")
+            self.latencies.append(latency)
+            self.bytes_written += byte_count
+            paths.append(path)
+        return paths
+
+    def close(self):
+        """Finish all writes, stop the threads and report the write
+        latency."""
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown(wait=True)
+        if self.latencies:
+            print(
+                f"{len(self.latencies)} outputs, {self.bytes_written} bytes written{' with fsync' if self.fsync else ''}: write latency mean {1000 * sum(self.latencies) / len(self.latencies):.1f} ms, max {1000 * max(self.latencies):.1f} ms; decoding waited {1000 * self.queue_wait:.1f} ms for the write queue"
+            )
+            self.latencies = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def writer_options(args):
+    """Split the OutputWriter options `--write-queue-depth=N` and
+    `--fsync` off the command line arguments `args`. Returns the
+    OutputWriter keyword arguments and the other arguments."""
+    options, other_args = dict(), []
+    for arg in args:
+        if arg.startswith(WRITE_QUEUE_DEPTH_OPTION):
+            options["queue_depth"] = int(arg[len(WRITE_QUEUE_DEPTH_OPTION):])
+        elif arg == FSYNC_OPTION:
+            options["fsync"] = True
+        else:
+            other_args.append(arg)
+    return options, other_args
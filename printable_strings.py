@@ -0,0 +1,88 @@
+#
+# printable_strings - find the text in a load, like `strings`
+#
+# nontama_to_bload.py and mload_to_bload.py list the text in each load with printable_strings, passing their 8-bit character map (PC6001_8BIT_CHARMAP or MSX_8BIT_CHARMAP). The printable characters, alternate character set pairs and the tables used to decode each string are worked out from the character map, so the search is the same for every machine. Strings decode the same as decode_pc6001_8bit_charset / decode_msx_8bit_charset with preserve=NO_CONTROLS, without going a byte at a time.
+
+import unicodedata
+
+STRINGS_MIN_LENGTH = 4
+
+VOICED_SOUND_MARKS = "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
+
+_string_classes = {}  # id(charmap) -> (charmap, (translate table, decode table, pair table, pair regex, voicing regex))
+
+
+def string_classes(charmap):
+    """Build the tables used by `printable_strings` for `charmap` on
+    first use: the `bytes.translate` table mapping each byte to `p` if
+    it is a printable character, `q` if it is one that also completes an
+    alternate character set pair, `r` if it only completes a pair, `a`
+    for an alternate character set prefix, or NUL; the `str.translate`
+    table decoding each byte on its own; the alternate characters keyed
+    by the decoded pair they replace, with a regular expression finding
+    those pairs; and a regular expression finding hiragana letters
+    followed by halfwidth (semi-)voiced sound marks."""
+    import re
+
+    cached = _string_classes.get(id(charmap))
+    if cached is not None and cached[0] is charmap:
+        return cached[1]
+    classes = bytearray(256)
+    chars = [None] * 256
+    for ch, code in charmap.items():
+        if len(code) == 1:
+            chars[code[0]] = ch
+            if 0x20 <= code[0] < 0x7F or (code[0] >= 0x80 and unicodedata.category(ch) != "Co"):
+                classes[code[0]] = ord("p")
+    pairs = {}
+    for ch, code in charmap.items():
+        if len(code) == 2:
+            classes[code[0]] = ord("a")
+            classes[code[1]] = ord("q") if classes[code[1]] in b"pq" else ord("r")
+            pairs[chars[code[0]] + chars[code[1]]] = ch
+    hiragana_letters = "".join(
+        sorted(ch for ch in charmap if unicodedata.name(ch, "?").lower().startswith("hiragana letter"))
+    )
+    tables = (
+        bytes(classes),
+        {code: ch for code, ch in enumerate(chars)},
+        pairs,
+        re.compile("|".join(re.escape(pair) for pair in pairs)),
+        re.compile("[%s][%s]+" % (re.escape(hiragana_letters), VOICED_SOUND_MARKS)) if hiragana_letters else None,
+    )
+    _string_classes[id(charmap)] = (charmap, tables)
+    return tables
+
+
+def _voice(match):
+    """Combine a hiragana letter with the halfwidth (semi-)voiced sound
+    marks after it one mark at a time, as the decoders do."""
+    s = match.group()[0]
+    for mark in match.group()[1:]:
+        if unicodedata.name(s[-1], "?").lower().startswith("hiragana letter"):
+            s = s[:-1] + unicodedata.normalize("NFKC", s[-1] + mark)
+        else:
+            s += mark
+    return s
+
+
+def printable_strings(data, charmap, start_addr=0, min_length=STRINGS_MIN_LENGTH):
+    """Yield the address and text of every run of at least `min_length`
+    printable characters of `charmap` (counting alternate character set
+    pairs as one) in `data`, which loads at `start_addr`. Runs are found
+    by classifying the whole of `data` with one `bytes.translate` and
+    matching the classes with one regular expression; each run is then
+    decoded with one `str.translate`, and only runs holding an alternate
+    character set prefix or a voiced sound mark need any more work."""
+    import re
+
+    classes, decode_table, pairs, pair_re, voicing_re = string_classes(charmap)
+    data = bytes(data)
+    text = data.decode("latin-1")
+    for match in re.finditer(rb"(?:[pq]|a[qr]){%d,}" % min_length, data.translate(classes)):
+        s = text[match.start() : match.end()].translate(decode_table)
+        if b"a" in match.group():
+            s = pair_re.sub(lambda pair: pairs[pair.group()], s)
+        if voicing_re is not None and (VOICED_SOUND_MARKS[0] in s or VOICED_SOUND_MARKS[1] in s):
+            s = voicing_re.sub(_voice, s)
+        yield start_addr + match.start(), s
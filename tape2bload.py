@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+#
+# tape2bload - convert tape images from any supported loader to BLOAD files
+#
+# Each input is sniffed to pick its format handler, so P6/P6T, CMT/T88 and CAS files can be mixed in one run. The handler modules are only imported once an input needs them. With --mkrom, the BLOAD files are also made into cartridge ROMs, using mkrom.py for PC-6001 games and mkmsxrom.py for MSX games.
+
+import importlib
+import os
+import sys
+
+# these duplicate the magic numbers in the handler modules so that sniffing does not need to import them
+MSX_CAS_HEADER = b"\x1f\xa6\xde\xba\xcc\x13\x7d\x74"  # mload_to_bload.MSX_CAS_HEADER
+NONTAMA_HEADER_START = b"\xffNONTAMA"  # nontama_to_bload.NONTAMA_HEADER_START
+IHEX_START = b"\r\n:"  # nontama_to_bload.IHEX_START; PC-6001 NONTAMA tapes start with an Intel HEX pre-loader
+T88_HEADER = b"PC-8801 Tape Image(T88)"
+PC8801_TAPE_IMAGE_EXTENSIONS = (".cmt", ".t88")
+
+TAPE_FORMAT_HANDLERS = dict(
+    pc6001_nontama=dict(
+        description="PC-6001 mkII NONTAMA loader (XOR'ed)",
+        module="nontama_to_bload",
+        convert="convert_tape",
+        options=dict(xor=True),
+        strings="pc6001_strings",
+        rom_builder=("mkrom", "mkrom_file"),
+        multiload_rom_builder=("mkrom", "mkmultiloadrom_file"),
+    ),
+    pc8801_nontama=dict(
+        description="PC-8801 NONTAMA loader (verbatim)",
+        module="nontama_to_bload",
+        convert="convert_tape",
+        options=dict(xor=False),
+        strings="pc6001_strings",  # NONTAMA load names are decoded as PC-6001 text for both
+        rom_builder=None,
+        multiload_rom_builder=None,
+    ),
+    msx_mload=dict(
+        description="MSX \"M\" loader",
+        module="mload_to_bload",
+        convert="convert_tape",
+        options=dict(),
+        strings="msx_strings",
+        rom_builder=("mkmsxrom", "mkmsxrom_file"),
+        multiload_rom_builder=None,
+    ),
+)
+
+
+def sniff_tape_format(tape_data, path=""):
+    """Return the name of the `TAPE_FORMAT_HANDLERS` entry for the
+    tape image `tape_data` (read from `path`), or None if it is not
+    recognized."""
+    if tape_data[: len(MSX_CAS_HEADER)] == MSX_CAS_HEADER:
+        return "msx_mload"
+    header_pos = tape_data.find(NONTAMA_HEADER_START)
+    if header_pos < 0:
+        return None
+    if tape_data.find(IHEX_START, 0, header_pos) >= 0:
+        return "pc6001_nontama"
+    if (
+        tape_data[: len(T88_HEADER)] == T88_HEADER
+        or os.path.splitext(path)[1].lower() in PC8801_TAPE_IMAGE_EXTENSIONS
+    ):
+        return "pc8801_nontama"
+    return "pc6001_nontama"
+
+
+def convert_tape(infn, *, tape_format=None, chain_mkrom=False, catalogue=None, list_strings=False):
+    """Convert the tape image `infn` with the handler for its sniffed
+    (or given) `tape_format`, then optionally build ROMs from the
+    results (one multi-load ROM for a tape with several loads, where
+    the format supports it) and list the text in each load, and return
+    the output file names. If a `catalogue` (see tape_catalogue.py) is given, tapes
+    already in it are skipped unless a file written for them is missing
+    (or, with `chain_mkrom`, no ROM was built), and new ones are added
+    to it along with their output files. The tape is hashed once here,
+    and the hash is passed on to the handler for its build stamps."""
+    import build_stamps
+    from tape_input import map_input_file
+
+    tape_data = map_input_file(infn)
+    input_hash = build_stamps.content_hash(tape_data)
+    if tape_format is None:
+        tape_format = sniff_tape_format(tape_data, infn)
+    assert (
+        tape_format in TAPE_FORMAT_HANDLERS
+    ), f"{infn}: unrecognized tape format {tape_format}, expected one of: {', '.join(TAPE_FORMAT_HANDLERS)}"
+    handler = TAPE_FORMAT_HANDLERS[tape_format]
+    chain_mkrom = chain_mkrom and handler["rom_builder"] is not None
+    if catalogue is not None:
+        import tape_catalogue
+
+        catalogued_source_path = tape_catalogue.catalogued_source(catalogue, input_hash)
+        catalogued_outputs = tape_catalogue.catalogued_outputs(catalogue, input_hash)
+        if (
+            catalogued_source_path is not None
+            and catalogued_outputs
+            and all(os.path.exists(output_path) for output_path, _ in catalogued_outputs)
+            and (not chain_mkrom or any(is_rom for _, is_rom in catalogued_outputs))
+        ):
+            tape_catalogue.add_source(
+                catalogue, source_path=os.path.abspath(infn), input_hash=input_hash
+            )
+            print(f"{infn}: skipped, already catalogued as {catalogued_source_path}")
+            return []
+    print(f"{infn}: {handler['description']}")
+    module = importlib.import_module(handler["module"])
+    on_load = None
+    if list_strings:
+        strings = getattr(module, handler["strings"])
+
+        def on_load(load, payload):
+            for addr, text in strings(payload, load["start_addr"]):
+                print(f"{load['outfns'][0]}: 0x{addr:04X} {text}")
+
+    loads = getattr(module, handler["convert"])(
+        infn, tape_data, **handler["options"], on_load=on_load, input_hash=input_hash
+    )
+    outfns = [outfn for load in loads for outfn in load["outfns"]]
+    if catalogue is not None:
+        for load_index, other_source_path, other_load_index in tape_catalogue.add_tape(
+            catalogue,
+            source_path=os.path.abspath(infn),
+            input_hash=input_hash,
+            tape_format=tape_format,
+            loads=loads,
+        ):
+            print(
+                f"{infn}: load {load_index} duplicates load {other_load_index} of {other_source_path}"
+            )
+    rom_outfns = []
+    bload_outfns = [outfn for outfn in outfns if outfn.endswith(".bin")]
+    if chain_mkrom and len(bload_outfns) > 1 and handler["multiload_rom_builder"] is not None:
+        rom_builder_module, rom_builder = handler["multiload_rom_builder"]
+        rom_builder = getattr(importlib.import_module(rom_builder_module), rom_builder)
+        rom_outfns = [
+            rom_builder(
+                bload_outfns, f"{os.path.splitext(os.path.basename(infn))[0]}_warrior.rom"
+            )
+        ]
+    elif chain_mkrom:
+        rom_builder_module, rom_builder = handler["rom_builder"]
+        rom_builder = getattr(importlib.import_module(rom_builder_module), rom_builder)
+        rom_outfns = [rom_builder(outfn) for outfn in bload_outfns]
+    if catalogue is not None:
+        tape_catalogue.set_outputs(
+            catalogue, input_hash=input_hash, outfns=outfns, rom_outfns=rom_outfns
+        )
+    return outfns + rom_outfns
+
+
+def main():
+    _, *args = (  # usage: python tape2bload.py [--mkrom] [--format=FORMAT] [--catalogue=CATALOGUE.sqlite] [--strings] INPUT.p6|INPUT.cas|INPUT.cmt ...  ## writes the same files as nontama_to_bload.py, mload_to_bload.py (and mkrom.py or mkmsxrom.py, with --mkrom) would; with --strings, also lists the text in each load
+        sys.argv
+    )
+    chain_mkrom = "--mkrom" in args
+    list_strings = "--strings" in args
+    tape_format = None
+    catalogue_file_path = None
+    for arg in args:
+        if arg.startswith("--format="):
+            tape_format = arg.split("=", 1)[1]
+        elif arg.startswith("--catalogue="):
+            catalogue_file_path = arg.split("=", 1)[1]
+        elif arg.startswith("--"):
+            assert arg in {"--mkrom", "--strings"}, f"Unknown option {arg}"
+    catalogue = None
+    if catalogue_file_path is not None:
+        import tape_catalogue
+
+        catalogue = tape_catalogue.open_catalogue(catalogue_file_path)
+    input_file_paths = [arg for arg in args if not arg.startswith("--")]
+    assert (
+        input_file_paths
+    ), f"No input tape images given; known formats: {', '.join(TAPE_FORMAT_HANDLERS)}"
+    failed_input_file_paths = []
+    for input_file_path in input_file_paths:
+        try:
+            assert os.path.exists(
+                input_file_path
+            ), f"{input_file_path}: input file does not exist"
+            convert_tape(
+                input_file_path,
+                tape_format=tape_format,
+                chain_mkrom=chain_mkrom,
+                catalogue=catalogue,
+                list_strings=list_strings,
+            )
+        except Exception as e:  # one bad tape should not stop a batch
+            print(f"{input_file_path}: failed: {type(e).__name__}: {e}", file=sys.stderr)
+            failed_input_file_paths.append(input_file_path)
+    if failed_input_file_paths:
+        sys.exit(
+            f"{len(failed_input_file_paths)} of {len(input_file_paths)} inputs failed: {' '.join(failed_input_file_paths)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#
+# tape_catalogue - SQLite catalogue of converted tapes
+#
+# tape2bload.py --catalogue=CATALOGUE.sqlite records every load it converts here: the source path and content hash of the tape (as computed by build_stamps.content_hash), the load index, the decoded load name, the start/stop/exe addresses and the content hash of the payload, along with the paths of the files written for each tape. Tapes whose hash is already catalogued are skipped as long as those files still exist, and loads whose payload is already catalogued from another tape are reported as duplicates. Run this script to query the catalogue.
+
+import os
+import sqlite3
+import sys
+
+CATALOGUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tapes (
+    input_hash TEXT PRIMARY KEY,
+    tape_format TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    source_path TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL REFERENCES tapes (input_hash)
+);
+CREATE TABLE IF NOT EXISTS loads (
+    input_hash TEXT NOT NULL REFERENCES tapes (input_hash),
+    load_index INTEGER NOT NULL,
+    load_name TEXT,
+    start_addr INTEGER NOT NULL,
+    stop_addr INTEGER NOT NULL,
+    exe_addr INTEGER NOT NULL,
+    payload_hash TEXT NOT NULL,
+    PRIMARY KEY (input_hash, load_index)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    input_hash TEXT NOT NULL REFERENCES tapes (input_hash),
+    output_path TEXT NOT NULL,
+    is_rom INTEGER NOT NULL,
+    PRIMARY KEY (input_hash, output_path)
+);
+CREATE INDEX IF NOT EXISTS sources_input_hash ON sources (input_hash);
+CREATE INDEX IF NOT EXISTS loads_payload_hash ON loads (payload_hash);
+CREATE INDEX IF NOT EXISTS loads_start_addr ON loads (start_addr);
+CREATE INDEX IF NOT EXISTS loads_exe_addr ON loads (exe_addr);
+CREATE INDEX IF NOT EXISTS loads_load_name ON loads (load_name);
+"""
+
+
+def open_catalogue(path):
+    catalogue = sqlite3.connect(path)
+    catalogue.executescript(CATALOGUE_SCHEMA)
+    return catalogue
+
+
+def catalogued_source(catalogue, input_hash):
+    """Return a source path already catalogued for a tape with
+    `input_hash`, or None if there is none."""
+    row = catalogue.execute(
+        "SELECT source_path FROM sources WHERE input_hash = ? ORDER BY source_path LIMIT 1",
+        (input_hash,),
+    ).fetchone()
+    return row and row[0]
+
+
+def catalogued_outputs(catalogue, input_hash):
+    """Return (output path, is ROM) for every file recorded as written
+    for the tape with `input_hash`."""
+    return [
+        (output_path, bool(is_rom))
+        for output_path, is_rom in catalogue.execute(
+            "SELECT output_path, is_rom FROM outputs WHERE input_hash = ? ORDER BY output_path",
+            (input_hash,),
+        )
+    ]
+
+
+def set_outputs(catalogue, *, input_hash, outfns, rom_outfns=()):
+    """Record `outfns` and the ROMs `rom_outfns` as the files written
+    for the tape with `input_hash`, replacing those recorded before."""
+    with catalogue:
+        catalogue.execute("DELETE FROM outputs WHERE input_hash = ?", (input_hash,))
+        catalogue.executemany(
+            "INSERT OR REPLACE INTO outputs (input_hash, output_path, is_rom) VALUES (?, ?, ?)",
+            [(input_hash, os.path.abspath(outfn), False) for outfn in outfns]
+            + [(input_hash, os.path.abspath(outfn), True) for outfn in rom_outfns],
+        )
+
+
+def add_source(catalogue, *, source_path, input_hash):
+    with catalogue:
+        catalogue.execute(
+            "INSERT OR REPLACE INTO sources (source_path, input_hash) VALUES (?, ?)",
+            (source_path, input_hash),
+        )
+
+
+def add_tape(catalogue, *, source_path, input_hash, tape_format, loads):
+    """Catalogue the `loads` (as returned by a converter's
+    `convert_tape`) of the tape at `source_path` and return a
+    (load index, other source path, other load index) tuple for every
+    load whose payload was already catalogued from another tape."""
+    duplicates = []
+    with catalogue:
+        catalogue.execute(
+            "INSERT OR REPLACE INTO tapes (input_hash, tape_format) VALUES (?, ?)",
+            (input_hash, tape_format),
+        )
+        catalogue.execute(
+            "INSERT OR REPLACE INTO sources (source_path, input_hash) VALUES (?, ?)",
+            (source_path, input_hash),
+        )
+        for load_index, load in enumerate(loads, 1):
+            payload_hash = load["payload_hash"]
+            duplicates += [
+                (load_index, other_source_path, other_load_index)
+                for other_source_path, other_load_index in catalogue.execute(
+                    "SELECT MIN(sources.source_path), loads.load_index FROM loads JOIN sources USING (input_hash) WHERE loads.payload_hash = ? AND loads.input_hash != ? GROUP BY loads.input_hash, loads.load_index",
+                    (payload_hash, input_hash),
+                )
+            ]
+            catalogue.execute(
+                "INSERT OR REPLACE INTO loads (input_hash, load_index, load_name, start_addr, stop_addr, exe_addr, payload_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    input_hash,
+                    load_index,
+                    load["load_name"],
+                    load["start_addr"],
+                    load["stop_addr"],
+                    load["exe_addr"],
+                    payload_hash,
+                ),
+            )
+    return duplicates
+
+
+LOAD_QUERY = "SELECT MIN(sources.source_path), loads.load_index, loads.load_name, loads.start_addr, loads.stop_addr, loads.exe_addr, loads.payload_hash FROM loads JOIN sources USING (input_hash)"
+
+
+def find_loads(catalogue, *, start_addr=None, exe_addr=None, load_name=None):
+    """Return (source path, load index, load name, start address, stop
+    address, exe address, payload hash) for every catalogued load
+    matching all the given criteria."""
+    criteria = dict(start_addr=start_addr, exe_addr=exe_addr, load_name=load_name)
+    criteria = {column: value for column, value in criteria.items() if value is not None}
+    where = " AND ".join(f"loads.{column} = ?" for column in criteria)
+    return catalogue.execute(
+        LOAD_QUERY
+        + (f" WHERE {where}" if where else "")
+        + " GROUP BY loads.input_hash, loads.load_index ORDER BY 1, 2",
+        tuple(criteria.values()),
+    ).fetchall()
+
+
+def find_duplicate_loads(catalogue):
+    """Return the loads (as `find_loads` does) whose payload was
+    catalogued from more than one tape."""
+    return catalogue.execute(
+        LOAD_QUERY
+        + " WHERE loads.payload_hash IN (SELECT payload_hash FROM loads GROUP BY payload_hash HAVING COUNT(DISTINCT input_hash) > 1) GROUP BY loads.input_hash, loads.load_index ORDER BY loads.payload_hash, 1, 2"
+    ).fetchall()
+
+
+def main():
+    _, catalogue_path, *args = (  # usage: python tape_catalogue.py CATALOGUE.sqlite [--duplicates] [--start=XXXX] [--exe=ZZZZ] [--name=NAME]  ## lists the matching catalogued loads
+        sys.argv
+    )
+    catalogue = open_catalogue(catalogue_path)
+    criteria = dict()
+    for arg in args:
+        if arg.startswith("--start="):
+            criteria["start_addr"] = int(arg.split("=", 1)[1], 16)
+        elif arg.startswith("--exe="):
+            criteria["exe_addr"] = int(arg.split("=", 1)[1], 16)
+        elif arg.startswith("--name="):
+            criteria["load_name"] = arg.split("=", 1)[1]
+        else:
+            assert arg == "--duplicates", f"Unknown option {arg}"
+    if "--duplicates" in args:
+        rows = find_duplicate_loads(catalogue)
+    else:
+        rows = find_loads(catalogue, **criteria)
+    for source_path, load_index, load_name, start_addr, stop_addr, exe_addr, payload_hash in rows:
+        print(
+            f"{source_path} load {load_index}: load_name={load_name}, start_addr=0x{start_addr:04X}, stop_addr=0x{stop_addr:04X}, exe_addr=0x{exe_addr:04X}, payload_hash={payload_hash}"
+        )
+
+
+if __name__ == "__main__":
+    main()
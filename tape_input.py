@@ -0,0 +1,36 @@
+#
+# tape_input - read tape images in place
+#
+# The converters and tape2bload.py map their inputs with map_input_file and search them with find_in_buffer, so large tape archives are paged in on demand rather than read into memory up front.
+
+import os
+
+SCAN_CHUNK_SIZE = 0x10000
+
+
+def find_in_buffer(b, sub, start=0, end=None):
+    """Like `bytes.find`, but also works for `memoryview` buffers
+    (e.g. over an `mmap`), which lack `.find`. Those are scanned in
+    `SCAN_CHUNK_SIZE` pieces so only the pages being searched are
+    touched."""
+    end = len(b) if end is None else min(end, len(b))
+    if hasattr(b, "find"):
+        return b.find(sub, start, end)
+    pos = start
+    while pos < end:
+        found = bytes(b[pos : min(end, pos + SCAN_CHUNK_SIZE + len(sub) - 1)]).find(sub)
+        if found >= 0:
+            return pos + found
+        pos += SCAN_CHUNK_SIZE
+    return -1
+
+
+def map_input_file(path):
+    """Return the contents of the file at `path` as a read-only
+    `mmap` (or `b""` for an empty file, which cannot be mapped)."""
+    import mmap
+
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)